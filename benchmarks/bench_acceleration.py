@@ -0,0 +1,151 @@
+"""Benchmark download acceleration against a bandwidth-capped local HLS server
+
+Run from the repository root:
+
+    python benchmarks/bench_acceleration.py --per-connection-mbps 16 --link-mbps 96
+
+A local server publishes an HLS stream of synthetic segments. It paces
+every connection to --per-connection-mbps and all connections together to
+--link-mbps, which simulates per-connection throttling in front of a
+faster link. The script downloads the stream with acceleration disabled
+(one connection), then repeatedly with the adaptive ConnectionTuner, and
+prints the connections chosen and the throughput of each run.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MEDIA_DOWNLOADER_CACHE_DIR', tempfile.mkdtemp())
+
+from media_downloader import MediaDownloader  # noqa: E402
+
+WRITE_SIZE = 16 * 1024
+
+
+class Pacer:
+    """Token bucket shared by all connections (the simulated link)"""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, size):
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate * 0.1, self.allowance + (now - self.updated) * self.rate)
+            self.updated = now
+            self.allowance -= size
+            delay = -self.allowance / self.rate if self.allowance < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+
+class ThrottledHLSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if self.path.endswith('.m3u8'):
+            body = server.playlist.encode()
+            content_type = 'application/vnd.apple.mpegurl'
+        elif self.path.startswith('/seg') and self.path.endswith('.ts'):
+            body = server.segment
+            content_type = 'video/mp2t'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # Pace each connection separately, and all of them through the shared link
+        connection_pacer = Pacer(server.per_connection_bps)
+        for offset in range(0, len(body), WRITE_SIZE):
+            chunk = body[offset:offset + WRITE_SIZE]
+            connection_pacer.wait(len(chunk))
+            server.link_pacer.wait(len(chunk))
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port, segments, segment_kb, per_connection_mbps, link_mbps):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ThrottledHLSHandler)
+    server.daemon_threads = True
+    server.segment = os.urandom(segment_kb * 1024)
+    server.playlist = '\n'.join(
+        ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+        + [line for index in range(segments) for line in ('#EXTINF:2.0,', f'seg{index}.ts')]
+        + ['#EXT-X-ENDLIST', '']
+    )
+    server.per_connection_bps = per_connection_mbps * 1024 * 1024 / 8
+    server.link_pacer = Pacer(link_mbps * 1024 * 1024 / 8)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed_download(downloader, url, opts):
+    """Download once, bypassing the artifact store; return (MB/s, connections used)"""
+    tuner = downloader.connection_tuner
+    connections = tuner.stats().get('127.0.0.1', {}).get('connections', tuner.start_connections)
+    started = time.perf_counter()
+    path = downloader.fetch_media(url, 'Video', 'Best', 'Original', opts)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path)
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    return size / 1024 / 1024 / elapsed, connections if tuner.enabled else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8598)
+    parser.add_argument('--segments', type=int, default=48)
+    parser.add_argument('--segment-kb', type=int, default=512)
+    parser.add_argument('--per-connection-mbps', type=float, default=16)
+    parser.add_argument('--link-mbps', type=float, default=96)
+    parser.add_argument('--runs', type=int, default=6)
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.segments, args.segment_kb, args.per_connection_mbps, args.link_mbps)
+    url = f'http://127.0.0.1:{args.port}/stream.m3u8'
+
+    downloader = MediaDownloader()
+    downloader.rate_limiter.rate = 1000.0
+    method_name, opts, info, errors = downloader.analyze(url)
+    if not info:
+        print(f"analysis failed: {errors}")
+        return 1
+    opts = dict(opts, quiet=True, noprogress=True)
+
+    downloader.connection_tuner.enabled = False
+    baseline, _ = timed_download(downloader, url, opts)
+    print(f"{'run':<10}{'connections':>12}{'MB/s':>10}{'speedup':>10}")
+    print(f"{'baseline':<10}{1:>12}{baseline:>10.2f}{1.0:>10.2f}")
+
+    downloader.connection_tuner.enabled = True
+    for run in range(1, args.runs + 1):
+        throughput, connections = timed_download(downloader, url, opts)
+        print(f"{'adaptive ' + str(run):<10}{connections:>12}{throughput:>10.2f}{throughput / baseline:>10.2f}")
+
+    tuning = downloader.connection_tuner.stats()['127.0.0.1']
+    print(f"settled: {tuning['settled']} at {tuning['connections']} connections")
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Measure extractor setup latency with and without the host routing table
+
+Run from the repository root:
+
+    python benchmarks/bench_extractor_routing.py --repeat 20
+
+For one URL per supported site, times what happens before yt-dlp sends its
+first request: creating YoutubeDL and finding the extractor for the URL.
+"unrouted" is the stock behaviour (every extractor loaded, URL patterns
+tried in order); "routed" creates YoutubeDL with only the routed family and
+pins the extractor. First-request numbers come from a fresh interpreter per
+site, where yt-dlp still has to compile the patterns it tries; steady-state
+numbers are the median of --repeat runs in a warm process. No network
+access is needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yt_dlp  # noqa: E402
+
+from media_downloader import get_extractor_router  # noqa: E402
+
+SITE_URLS = {
+    'YouTube': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'Vimeo': 'https://vimeo.com/76979871',
+    'Facebook': 'https://www.facebook.com/watch/?v=10153231379946729',
+    'Instagram': 'https://www.instagram.com/p/CqZ1QpXJ3kA/',
+    'Twitter': 'https://twitter.com/user/status/1234567890123456789',
+    'TikTok': 'https://www.tiktok.com/@user/video/7106594312292453675',
+    'Dailymotion': 'https://www.dailymotion.com/video/x7tgad0',
+    'Twitch': 'https://www.twitch.tv/videos/1234567890',
+    'Reddit': 'https://www.reddit.com/r/videos/comments/6rrwyj/that_small_heart_attack/',
+    'SoundCloud': 'https://soundcloud.com/artist/track',
+    'Bandcamp': 'https://artist.bandcamp.com/track/song',
+}
+OPTS = {'quiet': True, 'no_warnings': True}
+
+
+def setup_unrouted(url):
+    """YoutubeDL with every extractor, then the same scan extract_info does"""
+    ydl = yt_dlp.YoutubeDL(dict(OPTS))
+    ie_key = next(key for key, ie in ydl._ies.items() if ie.suitable(url))
+    ydl.get_info_extractor(ie_key)
+    return ie_key
+
+
+def setup_routed(url):
+    """Route the URL, then YoutubeDL with only that family and the extractor pinned"""
+    route = get_extractor_router().route(url)
+    ydl = yt_dlp.YoutubeDL(dict(OPTS, allowed_extractors=route.allowed_extractors))
+    ie = ydl._ies[route.ie_key]
+    assert ie.suitable(url)
+    ydl.get_info_extractor(route.ie_key)
+    return route.ie_key
+
+
+MODES = {'unrouted': setup_unrouted, 'routed': setup_routed}
+
+
+def timed(func, url):
+    started = time.perf_counter()
+    ie_key = func(url)
+    return (time.perf_counter() - started) * 1000, ie_key
+
+
+def first_request(mode, url):
+    """Run one setup in a fresh interpreter and return (ms, ie_key, router build ms)"""
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', mode, url],
+        check=True, capture_output=True, text=True, cwd=ROOT,
+    ).stdout
+    return json.loads(output)
+
+
+def child(mode, url):
+    # Importing yt-dlp and building the router happen at process start, not per request
+    started = time.perf_counter()
+    if mode == 'routed':
+        get_extractor_router()
+    build_ms = (time.perf_counter() - started) * 1000
+    ms, ie_key = timed(MODES[mode], url)
+    print(json.dumps([ms, ie_key, build_ms]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    print(f"{'site':<12} {'extractor':<14} "
+          f"{'first unrouted':>15} {'first routed':>13} {'steady unrouted':>16} {'steady routed':>14}  (ms)")
+    totals = {key: [] for key in ('first unrouted', 'first routed', 'steady unrouted', 'steady routed')}
+    build_times = []
+    for site, url in SITE_URLS.items():
+        row = {}
+        for mode, func in MODES.items():
+            ms, ie_key, build_ms = first_request(mode, url)
+            row[f'first {mode}'] = ms
+            if mode == 'routed':
+                build_times.append(build_ms)
+            func(url)  # warm up this process
+            row[f'steady {mode}'] = statistics.median(timed(func, url)[0] for _ in range(args.repeat))
+        for key, value in row.items():
+            totals[key].append(value)
+        print(f"{site:<12} {ie_key:<14} {row['first unrouted']:>15.1f} {row['first routed']:>13.1f} "
+              f"{row['steady unrouted']:>16.1f} {row['steady routed']:>14.1f}")
+
+    print(f"{'median':<27} " + ' '.join(
+        f"{statistics.median(totals[key]):>{width}.1f}"
+        for key, width in zip(totals, (15, 13, 16, 14))
+    ))
+    print(f"Router build (once per process, at startup): {statistics.median(build_times):.0f} ms")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
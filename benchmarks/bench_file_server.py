@@ -0,0 +1,91 @@
+"""Check that the file server streams multi-GB files with flat memory usage
+
+Run from the repository root:
+
+    python benchmarks/bench_file_server.py --size-gb 3
+
+A sparse file of the requested size is streamed through FileServer and the
+process RSS is sampled while reading. The script exits non-zero if RSS grows
+by more than --max-growth-mb or a Range request returns the wrong bytes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_downloader import FileServer  # noqa: E402
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux /proc)"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-gb', type=float, default=3.0)
+    parser.add_argument('--port', type=int, default=8599)
+    parser.add_argument('--max-growth-mb', type=float, default=64.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.bin')
+        size = int(args.size_gb * 1024 ** 3)
+        with open(path, 'wb') as f:
+            f.truncate(size)
+            f.seek(size - 4)
+            f.write(b'TAIL')
+
+        server = FileServer('127.0.0.1', args.port, f'http://127.0.0.1:{args.port}')
+        link = server.register(path)
+
+        baseline = current_rss_mb()
+        peak = baseline
+        received = 0
+        started = time.perf_counter()
+        with urllib.request.urlopen(link) as response:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received % (256 * CHUNK_SIZE) == 0:
+                    peak = max(peak, current_rss_mb())
+        elapsed = time.perf_counter() - started
+        peak = max(peak, current_rss_mb())
+
+        request = urllib.request.Request(link, headers={'Range': 'bytes=-4'})
+        with urllib.request.urlopen(request) as response:
+            tail = response.read()
+            range_status = response.status
+        server.shutdown()
+
+    growth = peak - baseline
+    print(f"streamed {received / 1024 ** 3:.2f} GB in {elapsed:.1f}s "
+          f"({received / 1024 ** 2 / elapsed:.0f} MB/s)")
+    print(f"rss baseline {baseline:.0f} MB, peak {peak:.0f} MB, growth {growth:.1f} MB")
+
+    failures = []
+    if received != size:
+        failures.append(f"received {received} bytes, expected {size}")
+    if range_status != 206 or tail != b'TAIL':
+        failures.append(f"range request returned {range_status} {tail!r}")
+    if growth > args.max_growth_mb:
+        failures.append(f"rss grew by {growth:.1f} MB (limit {args.max_growth_mb} MB)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
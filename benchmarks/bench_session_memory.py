@@ -0,0 +1,157 @@
+"""Compare the per-session memory footprint of analyzed video info
+
+Run from the repository root:
+
+    python benchmarks/bench_session_memory.py --sessions 50
+
+A YouTube-sized info dict is generated (DASH, HLS and storyboard formats
+with signed URLs, headers and fragment lists). The script then measures,
+with tracemalloc, what each session retains in st.session_state.video_info:
+the old plain dict holding the raw formats list, and the compact VideoInfo.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MEDIA_DOWNLOADER_CACHE_DIR', tempfile.mkdtemp())
+
+from media_downloader import MediaDownloader  # noqa: E402
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Sec-Fetch-Mode': 'navigate',
+}
+
+
+def signed_url(rng, itag):
+    """A googlevideo-style stream URL (~1 KB of query string)"""
+    params = '&'.join(f"{key}={''.join(rng.choices('abcdefghijklmnopqrstuvwxyz0123456789_-', k=48))}"
+                      for key in ('expire', 'ei', 'ip', 'id', 'source', 'requiressl', 'sig', 'lsig',
+                                  'mh', 'mm', 'mn', 'ms', 'mv', 'pl', 'initcwndbps', 'spc', 'vprv'))
+    return f"https://rr3---sn-abc123.googlevideo.com/videoplayback?itag={itag}&{params}"
+
+
+def make_info_dict(seed=0, duration=1800):
+    """Build a deterministic info dict shaped like a real YouTube extraction"""
+    rng = random.Random(seed)
+    formats = []
+
+    # Storyboards: many fragments each
+    for index in range(4):
+        formats.append({
+            'format_id': f'sb{index}', 'format_note': 'storyboard', 'ext': 'mhtml', 'protocol': 'mhtml',
+            'acodec': 'none', 'vcodec': 'none', 'url': signed_url(rng, f'sb{index}'),
+            'width': 48 * (index + 1), 'height': 27 * (index + 1), 'fps': 0.5, 'columns': 10, 'rows': 10,
+            'fragments': [{'url': signed_url(rng, f'sb{index}-{n}'), 'duration': 200.0} for n in range(duration // 200)],
+            'http_headers': dict(HEADERS), 'audio_ext': 'none', 'video_ext': 'none',
+        })
+
+    # DASH video/audio and HLS variants
+    heights = [144, 240, 360, 480, 720, 1080, 1440, 2160]
+    itag = 100
+    for protocol in ('https', 'm3u8_native'):
+        for height in heights:
+            for vcodec, ext in (('avc1.64001F', 'mp4'), ('vp09.00.40.08', 'webm'), ('av01.0.08M.08', 'mp4')):
+                for fps in (30, 60):
+                    itag += 1
+                    fmt = {
+                        'format_id': str(itag), 'format_note': f'{height}p', 'ext': ext, 'protocol': protocol,
+                        'vcodec': vcodec, 'acodec': 'none', 'height': height, 'width': height * 16 // 9,
+                        'fps': fps, 'tbr': height * 3.1, 'vbr': height * 3.1, 'filesize': height * 90000,
+                        'url': signed_url(rng, itag), 'http_headers': dict(HEADERS),
+                        'downloader_options': {'http_chunk_size': 10485760},
+                        'container': f'{ext}_dash', 'dynamic_range': 'SDR', 'language': None,
+                        'quality': heights.index(height), 'has_drm': False, 'source_preference': -1,
+                        'video_ext': ext, 'audio_ext': 'none', 'resolution': f'{height * 16 // 9}x{height}',
+                        'aspect_ratio': 1.78, 'format': f'{itag} - {height}p',
+                    }
+                    if protocol == 'm3u8_native':
+                        fmt['manifest_url'] = signed_url(rng, f'hls{itag}')
+                        fmt['fragments'] = [{'url': signed_url(rng, f'{itag}-{n}'), 'duration': 5.0}
+                                            for n in range(duration // 5 // 10)]
+                    formats.append(fmt)
+    for acodec, ext, abr in (('mp4a.40.2', 'm4a', 129), ('mp4a.40.5', 'm4a', 48), ('opus', 'webm', 160),
+                             ('opus', 'webm', 70), ('opus', 'webm', 50)):
+        itag += 1
+        formats.append({
+            'format_id': str(itag), 'ext': ext, 'protocol': 'https', 'vcodec': 'none', 'acodec': acodec,
+            'abr': abr, 'tbr': abr, 'asr': 48000, 'audio_channels': 2, 'filesize': abr * 125 * duration,
+            'url': signed_url(rng, itag), 'http_headers': dict(HEADERS),
+            'downloader_options': {'http_chunk_size': 10485760}, 'container': f'{ext}_dash',
+            'audio_ext': ext, 'video_ext': 'none', 'format': f'{itag} - audio only',
+        })
+
+    return {
+        'id': VIDEO_ID, 'title': 'Benchmark video', 'duration': duration, 'uploader': 'Uploader',
+        'view_count': 123456789, 'upload_date': '20240101', 'extractor_key': 'Youtube',
+        'thumbnail': f'https://i.ytimg.com/vi/{VIDEO_ID}/maxresdefault.jpg',
+        'webpage_url': f'https://www.youtube.com/watch?v={VIDEO_ID}',
+        'formats': formats,
+    }
+
+
+def legacy_video_info(info):
+    """The session-state dict stored before VideoInfo existed"""
+    return {
+        'title': info.get('title', 'Unknown Title'),
+        'duration': info.get('duration', 0),
+        'uploader': info.get('uploader', 'Unknown'),
+        'view_count': info.get('view_count') or 0,
+        'upload_date': info.get('upload_date', ''),
+        'thumbnail': info.get('thumbnail', ''),
+        'formats': info.get('formats', []),
+        'platform': 'YouTube',
+    }
+
+
+def retained_per_session(payload, build, sessions):
+    """Average bytes retained per session when each session decodes and keeps one entry"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = []
+    for _ in range(sessions):
+        # Every session gets its own decoded copy, as on a metadata cache disk hit
+        kept.append(build(json.loads(payload)))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50)
+    args = parser.parse_args()
+
+    downloader = MediaDownloader()
+    url = f'https://www.youtube.com/watch?v={VIDEO_ID}'
+    payload = json.dumps(make_info_dict())
+
+    legacy = retained_per_session(payload, legacy_video_info, args.sessions)
+    compact = retained_per_session(
+        payload, lambda info: downloader.format_video_info(info, url, 'web'), args.sessions
+    )
+    indexed = retained_per_session(
+        payload,
+        lambda info: (lambda video_info: (video_info, video_info.format_index))(
+            downloader.format_video_info(info, url, 'web')
+        ),
+        args.sessions
+    )
+
+    print(f"info dict: {len(json.loads(payload)['formats'])} formats, {len(payload) / 1024:.0f} KB as JSON")
+    print(f"legacy dict per session:        {legacy / 1024:8.1f} KB")
+    print(f"VideoInfo per session:          {compact / 1024:8.1f} KB")
+    print(f"VideoInfo + FormatIndex:        {indexed / 1024:8.1f} KB")
+    print(f"reduction:                      {legacy / compact:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+"""Offline benchmark and load test of the download engine against a local media server
+
+Run from the repository root:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+
+Synthetic media is generated into a temporary directory (with ffmpeg when it
+is installed) and published by a local HTTP server with Range support as a
+progressive MP4, a DASH manifest (separate video and audio) and an HLS
+playlist. Every URL goes through yt-dlp's generic extractor, so no network
+access is needed. The suite measures:
+
+* analyze latency, cold (new URL) and warm (metadata cache hit)
+* download throughput of each media kind
+* postprocessing time: HLS fixup to MP4, DASH merge, MP3 extraction
+* the number of concurrent jobs sustained, by submitting increasing
+  numbers of downloads at once until jobs fail or get too slow
+* peak RSS of each stage and of child processes (ffmpeg)
+
+Results are written as JSON. --compare prints the change of every numeric
+metric against an earlier result file. Without ffmpeg the DASH stage and
+postprocessing are skipped and the media is random bytes.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MEDIA_DOWNLOADER_CACHE_DIR', tempfile.mkdtemp())
+
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4a': 'audio/mp4',
+    '.mpd': 'application/dash+xml',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+MEDIA_PATHS = {'progressive': 'progressive.mp4', 'dash': 'dash/manifest.mpd', 'hls': 'hls/stream.m3u8'}
+
+DASH_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S"
+     mediaPresentationDuration="PT{duration}S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video">
+      <Representation id="video" bandwidth="{video_bps}" codecs="avc1.64001f" width="1280" height="720" frameRate="30">
+        <BaseURL>video.mp4</BaseURL>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4" contentType="audio" lang="en">
+      <Representation id="audio" bandwidth="128000" codecs="mp4a.40.2" audioSamplingRate="44100">
+        <BaseURL>audio.m4a</BaseURL>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+def run_ffmpeg(ffmpeg, *args):
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+
+
+def make_media(root, duration, video_mbps, ffmpeg):
+    """Write the synthetic media under root; return the media kinds that were created"""
+    os.makedirs(os.path.join(root, 'dash'))
+    os.makedirs(os.path.join(root, 'hls'))
+    progressive = os.path.join(root, MEDIA_PATHS['progressive'])
+    segment_seconds = 4
+
+    if not ffmpeg:
+        # Random bytes still exercise extraction and transfer, but nothing can be decoded
+        size = int(duration * video_mbps * 1024 * 1024 / 8)
+        with open(progressive, 'wb') as f:
+            f.write(os.urandom(size))
+        segments = max(1, duration // segment_seconds)
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{segment_seconds}']
+        for index in range(segments):
+            with open(os.path.join(root, 'hls', f'seg{index:03d}.ts'), 'wb') as f:
+                f.write(os.urandom(size // segments))
+            lines += [f'#EXTINF:{segment_seconds}.0,', f'seg{index:03d}.ts']
+        with open(os.path.join(root, MEDIA_PATHS['hls']), 'w') as f:
+            f.write('\n'.join(lines + ['#EXT-X-ENDLIST', '']))
+        return ['progressive', 'hls']
+
+    run_ffmpeg(
+        ffmpeg,
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', f'{video_mbps}M', '-g', '60',
+        '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', progressive,
+    )
+    run_ffmpeg(ffmpeg, '-i', progressive, '-map', '0:v', '-c', 'copy', '-movflags', '+faststart',
+               os.path.join(root, 'dash', 'video.mp4'))
+    run_ffmpeg(ffmpeg, '-i', progressive, '-map', '0:a', '-c', 'copy', '-movflags', '+faststart',
+               os.path.join(root, 'dash', 'audio.m4a'))
+    with open(os.path.join(root, MEDIA_PATHS['dash']), 'w') as f:
+        f.write(DASH_MANIFEST.format(duration=duration, video_bps=int(video_mbps * 1000 * 1000)))
+    run_ffmpeg(
+        ffmpeg, '-i', progressive, '-c', 'copy', '-f', 'hls', '-hls_time', str(segment_seconds),
+        '-hls_playlist_type', 'vod', '-hls_segment_filename', os.path.join(root, 'hls', 'seg%03d.ts'),
+        os.path.join(root, MEDIA_PATHS['hls']),
+    )
+    return ['progressive', 'dash', 'hls']
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Static files from server.root with single-range support; query strings are ignored"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        relative = self.path.split('?', 1)[0].lstrip('/')
+        path = os.path.realpath(os.path.join(self.server.root, relative))
+        if not path.startswith(self.server.root + os.sep) or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = RANGE_PATTERN.match(self.headers.get('Range', ''))
+        if match and match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        remaining = end - start + 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # yt-dlp closes connections it no longer needs; only report real failures
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(root, port):
+    server = MediaServer(('127.0.0.1', port), MediaHandler)
+    server.root = os.path.realpath(root)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux /proc)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRss:
+    """Sample this process's RSS on a background thread while the block runs"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+class UrlFactory:
+    """Hand out unique URLs so every request misses the metadata cache and artifact store"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, kind):
+        with self.lock:
+            self.counter += 1
+            return f"{self.base_url}/{MEDIA_PATHS[kind]}?run={self.counter}"
+
+
+def summarize(values):
+    """Median, p95 and max of a list of numbers, rounded for the JSON report"""
+    ordered = sorted(values)
+    return {
+        'median': round(statistics.median(ordered), 4),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'max': round(ordered[-1], 4),
+        'runs': len(ordered),
+    }
+
+
+def bench_analyze(downloader, new_url, kinds, runs):
+    results = {}
+    for kind in kinds:
+        cold, warm = [], []
+        for _ in range(runs):
+            url = new_url(kind)
+            started = time.perf_counter()
+            downloader.get_video_info(url)
+            cold.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            downloader.get_video_info(url)
+            warm.append((time.perf_counter() - started) * 1000)
+        results[kind] = {'cold_ms': summarize(cold), 'warm_ms': summarize(warm)}
+        print(f"analyze   {kind:<12} cold {results[kind]['cold_ms']['median']:8.1f} ms   "
+              f"warm {results[kind]['warm_ms']['median']:6.2f} ms")
+    return results
+
+
+def bench_download(downloader, new_url, kinds, runs):
+    """Transfer throughput of each kind, bypassing the artifact store"""
+    results = {}
+    for kind in kinds:
+        speeds, seconds = [], []
+        size = 0
+        for _ in range(runs):
+            url = new_url(kind)
+            opts = downloader.get_video_info(url).opts
+            started = time.perf_counter()
+            path = downloader.fetch_media(url, 'Video', 'Best', 'Original', opts)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(path)
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            seconds.append(elapsed)
+            speeds.append(size / 1024 / 1024 / elapsed)
+        results[kind] = {'mb_per_s': summarize(speeds), 'seconds': summarize(seconds), 'bytes': size}
+        print(f"download  {kind:<12} {results[kind]['mb_per_s']['median']:8.1f} MB/s   "
+              f"{results[kind]['seconds']['median']:6.2f} s")
+    return results
+
+
+def wait_for_jobs(downloader, job_ids, timeout):
+    deadline = time.time() + timeout
+    jobs = []
+    for job_id in job_ids:
+        job = downloader.job_manager.get(job_id)
+        while job.active and time.time() < deadline:
+            time.sleep(0.05)
+        jobs.append(job)
+    return jobs
+
+
+def bench_postprocess(downloader, new_url, kinds, runs, timeout):
+    """Time spent in yt-dlp postprocessors by real jobs that need ffmpeg"""
+    cases = [
+        # The HLS download is MPEG-TS; yt-dlp's FixupM3u8 remuxes it to MP4
+        ('hls_fixup_mp4', 'hls', ('Video', 'Best', 'MP4')),
+        ('dash_merge', 'dash', ('Video', 'Best', 'Original')),
+        ('extract_mp3', 'progressive', ('Audio', '192', 'MP3')),
+    ]
+    results = {}
+    for name, kind, choices in cases:
+        if kind not in kinds:
+            continue
+        totals, errors = [], []
+        for _ in range(runs):
+            url = new_url(kind)
+            opts = downloader.get_video_info(url).opts
+            job = wait_for_jobs(downloader, [downloader.start_download(url, *choices, opts)], timeout)[0]
+            if job.error or job.active:
+                errors.append(str(job.error or 'timed out'))
+                continue
+            totals.append(sum(job.postprocessor_times.values()))
+        results[name] = {'seconds': summarize(totals) if totals else None, 'errors': errors}
+        if totals:
+            print(f"postproc  {name:<12} {results[name]['seconds']['median']:8.2f} s")
+        else:
+            print(f"postproc  {name:<12} failed: {errors[:1]}")
+    return results
+
+
+def bench_load(downloader, new_url, kind, levels, max_job_seconds, timeout):
+    """Submit level jobs at once for each level; a level is sustained if all finish in time"""
+    results = []
+    max_sustained = 0
+    for level in levels:
+        urls = [new_url(kind) for _ in range(level)]
+        opts = [downloader.get_video_info(url).opts for url in urls]
+        with PeakRss() as rss:
+            started = time.perf_counter()
+            job_ids = [
+                downloader.start_download(url, 'Video', 'Best', 'Original', working_opts)
+                for url, working_opts in zip(urls, opts)
+            ]
+            jobs = wait_for_jobs(downloader, job_ids, timeout)
+            wall = time.perf_counter() - started
+
+        finished = [job for job in jobs if not job.active and not job.error]
+        latencies = [job.finished_at - job.created_at for job in finished]
+        total_bytes = sum(os.path.getsize(job.result) for job in finished if job.result and os.path.exists(job.result))
+        row = {
+            'jobs': level,
+            'completed': len(finished),
+            'failed': level - len(finished),
+            'wall_seconds': round(wall, 3),
+            'jobs_per_s': round(len(finished) / wall, 3),
+            'aggregate_mb_per_s': round(total_bytes / 1024 / 1024 / wall, 2),
+            'job_seconds': summarize(latencies) if latencies else None,
+            'peak_rss_mb': round(rss.peak_mb, 1),
+        }
+        row['sustained'] = row['failed'] == 0 and row['job_seconds']['p95'] <= max_job_seconds
+        results.append(row)
+        print(f"load      {level:>3} jobs    {row['completed']:>3} done  {row['wall_seconds']:7.2f} s  "
+              f"{row['aggregate_mb_per_s']:8.1f} MB/s  p95 {row['job_seconds']['p95'] if latencies else '-'} s  "
+              f"RSS {row['peak_rss_mb']:.0f} MB")
+        if not row['sustained']:
+            break
+        max_sustained = level
+    return results, max_sustained
+
+
+def flatten(value, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1} for numeric leaves; list rows are keyed by their 'jobs' count"""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    items = {}
+    if isinstance(value, dict):
+        children = value.items()
+    elif isinstance(value, list):
+        children = ((f"jobs={row.get('jobs', index)}", row) for index, row in enumerate(value) if isinstance(row, dict))
+    else:
+        return items
+    for key, child in children:
+        items.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+    return items
+
+
+def compare(new, old):
+    """Print every numeric metric present in both reports with its relative change"""
+    new_metrics, old_metrics = flatten(new['results']), flatten(old['results'])
+    print(f"\n{'metric':<48}{'before':>12}{'after':>12}{'change':>10}")
+    for key in sorted(new_metrics.keys() & old_metrics.keys()):
+        before, after = old_metrics[key], new_metrics[key]
+        change = f"{(after - before) / before:+.1%}" if before else 'n/a'
+        print(f"{key:<48}{before:>12.4g}{after:>12.4g}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8597)
+    parser.add_argument('--duration', type=int, default=20, help="Seconds of synthetic media")
+    parser.add_argument('--video-mbps', type=float, default=4.0, help="Video bitrate of the synthetic media")
+    parser.add_argument('--runs', type=int, default=5, help="Repetitions of each analyze/download measurement")
+    parser.add_argument('--postprocess-runs', type=int, default=2)
+    parser.add_argument('--load-kind', choices=sorted(MEDIA_PATHS), default='hls')
+    parser.add_argument('--load-levels', default='1,2,4,8,16', help="Concurrent job counts to try, ascending")
+    parser.add_argument('--max-job-seconds', type=float, default=60.0,
+                        help="p95 job time above which a load level counts as not sustained")
+    parser.add_argument('--timeout', type=float, default=600.0, help="Give up waiting for jobs after this long")
+    parser.add_argument('--output', default=f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    parser.add_argument('--compare', help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    levels = sorted({int(level) for level in args.load_levels.split(',')})
+    # Let the job pool go as wide as the largest load level; the box is what is being measured
+    os.environ.setdefault('MEDIA_DOWNLOADER_WORKERS', str(max(levels)))
+    import yt_dlp
+    from media_downloader import MediaDownloader
+
+    ffmpeg = shutil.which('ffmpeg')
+    media_root = tempfile.mkdtemp(prefix='bench-media-')
+    print(f"generating {args.duration}s of synthetic media {'with ffmpeg' if ffmpeg else '(no ffmpeg: random bytes)'}")
+    kinds = make_media(media_root, args.duration, args.video_mbps, ffmpeg)
+    server = start_server(media_root, args.port)
+    new_url = UrlFactory(f"http://127.0.0.1:{args.port}")
+
+    downloader = MediaDownloader()
+    # The local server is not a host to be polite to
+    downloader.rate_limiter.rate = 1000.0
+    downloader.rate_limiter.burst = 1000.0
+
+    results = {}
+    peak_rss = {}
+    try:
+        with PeakRss() as rss:
+            results['analyze'] = bench_analyze(downloader, new_url, kinds, args.runs)
+        peak_rss['analyze'] = round(rss.peak_mb, 1)
+        with PeakRss() as rss:
+            results['download'] = bench_download(downloader, new_url, kinds, args.runs)
+        peak_rss['download'] = round(rss.peak_mb, 1)
+        if ffmpeg:
+            with PeakRss() as rss:
+                results['postprocess'] = bench_postprocess(
+                    downloader, new_url, kinds, args.postprocess_runs, args.timeout
+                )
+            peak_rss['postprocess'] = round(rss.peak_mb, 1)
+        results['load'], results['max_concurrent_jobs'] = bench_load(
+            downloader, new_url, args.load_kind, levels, args.max_job_seconds, args.timeout
+        )
+    finally:
+        server.shutdown()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    peak_rss['process'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    peak_rss['child_processes'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    results['peak_rss_mb'] = peak_rss
+    print(f"max concurrent jobs sustained: {results['max_concurrent_jobs']}   peak RSS {peak_rss}")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'yt_dlp': yt_dlp.version.__version__,
+            'ffmpeg': bool(ffmpeg),
+        },
+        'config': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    failed = sum(row['failed'] for row in results['load'])
+    return 1 if failed and results['max_concurrent_jobs'] == 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Command-line entry point to the media downloader, for cron jobs and workers
+
+    python cli.py analyze URL [URL ...]
+    python cli.py download URL [URL ...] --type audio --quality 192 --format mp3 -o downloads/
+    python cli.py batch urls.txt --jobs 4 --archive batch.zip
+    python cli.py strategies
+
+Every command prints one JSON object per URL (JSON lines) on stdout and
+exits with status 1 if any URL failed; strategies prints one object per
+platform and extraction strategy. Configuration comes from the same
+MEDIA_DOWNLOADER_* environment variables as the web app.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from media_downloader import (
+    AUDIO_FORMATS, AUDIO_QUALITIES, BATCH_CONCURRENCY, VIDEO_FORMATS, VIDEO_QUALITIES,
+    AnalysisError, BatchLimits, BatchScheduler, MediaDownloader, parse_clip_range,
+)
+
+_print_lock = threading.Lock()
+
+
+def emit(record):
+    """Write one JSON line to stdout"""
+    with _print_lock:
+        sys.stdout.write(json.dumps(record, default=str) + '\n')
+        sys.stdout.flush()
+
+
+def failure(url, error):
+    record = {'url': url, 'ok': False, 'error': str(error)}
+    if isinstance(error, AnalysisError):
+        record['bot_detection'] = error.bot_detection
+    return record
+
+
+def resolve_choices(args):
+    """Map CLI spellings ('video', 'best', 'mp3') onto the choices the engine expects"""
+    if args.type == 'audio':
+        qualities, formats = AUDIO_QUALITIES, AUDIO_FORMATS
+        quality, output_format = args.quality or '192', args.format or 'mp3'
+    else:
+        qualities, formats = VIDEO_QUALITIES, VIDEO_FORMATS
+        quality, output_format = args.quality or 'best', args.format or 'original'
+
+    quality = next((choice for choice in qualities if choice.lower() == quality.lower()), None)
+    output_format = next((choice for choice in formats if choice.lower() == output_format.lower()), None)
+    if quality is None:
+        raise SystemExit(f"--quality must be one of: {', '.join(qualities)}")
+    if output_format is None:
+        raise SystemExit(f"--format must be one of: {', '.join(formats)}")
+    return args.type.capitalize(), quality, output_format
+
+
+def analyze_url(downloader, url):
+    try:
+        video_info = downloader.get_video_info(url).video_info
+    except Exception as e:
+        return failure(url, e)
+    return {
+        'url': url,
+        'ok': True,
+        'media_id': video_info.media_id,
+        'title': video_info.title,
+        'duration': video_info.duration,
+        'uploader': video_info.uploader,
+        'view_count': video_info.view_count,
+        'upload_date': video_info.upload_date,
+        'platform': video_info.platform,
+        'method': video_info.method,
+        'formats': [record._asdict() for record in video_info.formats],
+    }
+
+
+def download_url(downloader, url, choices, args):
+    started = time.time()
+    try:
+        analysis = downloader.get_video_info(url)
+        clip = parse_clip_range(args.start, args.end, analysis.video_info.duration, args.precise)
+        result = downloader.download_media(url, *choices, analysis.opts, clip)
+        target = os.path.join(args.output, os.path.basename(result.path))
+        # The artifact store keeps its own copy for later requests
+        shutil.copy2(result.path, target)
+    except Exception as e:
+        return failure(url, e)
+    return {
+        'url': url,
+        'ok': True,
+        'title': analysis.video_info.title,
+        'file': target,
+        'size': result.size,
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def run_parallel(func, urls, jobs):
+    """Run func(url) for every URL on jobs threads, emitting results as they finish"""
+    ok = True
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [executor.submit(func, url) for url in urls]
+        for future in as_completed(futures):
+            record = future.result()
+            ok = ok and record['ok']
+            emit(record)
+    return ok
+
+
+def command_analyze(downloader, args):
+    return run_parallel(lambda url: analyze_url(downloader, url), args.urls, args.jobs)
+
+
+def command_download(downloader, args):
+    choices = resolve_choices(args)
+    os.makedirs(args.output, exist_ok=True)
+    return run_parallel(lambda url: download_url(downloader, url, choices, args), args.urls, args.jobs)
+
+
+def command_batch(downloader, args):
+    choices = resolve_choices(args)
+    source = sys.stdin if args.file == '-' else open(args.file)
+    with source:
+        urls = [line.strip() for line in source if line.strip() and not line.startswith('#')]
+
+    emitted = 0
+
+    def emit_new_results(done, total):
+        nonlocal emitted
+        for result in scheduler.results[emitted:]:
+            emit(dict(result, ok=result['status'] == 'done'))
+        emitted = len(scheduler.results)
+
+    scheduler = BatchScheduler(
+        downloader, *choices, concurrency=args.jobs,
+        # --jobs is the global limit of this process
+        limits=BatchLimits(concurrency=args.jobs), progress_callback=emit_new_results,
+    )
+    scheduler.run(urls)
+    if args.archive and any(result['file'] for result in scheduler.results):
+        scheduler.write_archive(args.archive)
+    return all(result['status'] == 'done' for result in scheduler.results)
+
+
+def command_strategies(downloader, args):
+    for row in downloader.strategy_registry.export():
+        emit(row)
+    return True
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze and download media without the web UI")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', help="Print metadata and formats of each URL")
+    analyze.add_argument('urls', nargs='+')
+    analyze.add_argument('-j', '--jobs', type=int, default=4, help="URLs analyzed in parallel")
+    analyze.set_defaults(func=command_analyze)
+
+    def add_format_options(subparser):
+        subparser.add_argument('--type', choices=['video', 'audio'], default='video')
+        subparser.add_argument('--quality', help="Video: best, 1080p ... worst; audio: kbps (default 192)")
+        subparser.add_argument('--format', help="Video: original, mp4, webm; audio: mp3, aac, ogg")
+
+    download = subparsers.add_parser('download', help="Download each URL into the output directory")
+    download.add_argument('urls', nargs='+')
+    add_format_options(download)
+    download.add_argument('--start', help="Clip start (seconds, MM:SS or HH:MM:SS)")
+    download.add_argument('--end', help="Clip end (seconds, MM:SS or HH:MM:SS)")
+    download.add_argument('--precise', action='store_true', help="Re-encode the clip for keyframe-accurate cuts")
+    download.add_argument('-o', '--output', default='.', help="Directory the files are copied to")
+    download.add_argument('-j', '--jobs', type=int, default=2, help="URLs downloaded in parallel")
+    download.set_defaults(func=command_download)
+
+    batch = subparsers.add_parser('batch', help="Download a list of URLs, playlists or channels")
+    batch.add_argument('file', help="File with one URL per line, or - for stdin")
+    add_format_options(batch)
+    batch.add_argument('--archive', help="Also bundle the files into this ZIP (with manifest.json)")
+    batch.add_argument('-j', '--jobs', type=int, default=BATCH_CONCURRENCY, help="Items processed in parallel")
+    batch.set_defaults(func=command_batch)
+
+    strategies = subparsers.add_parser('strategies', help="Print the per-platform extraction strategy stats")
+    strategies.set_defaults(func=command_strategies)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    downloader = MediaDownloader()
+    return 0 if args.func(downloader, args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
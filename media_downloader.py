@@ -0,0 +1,2614 @@
+"""Download engine shared by the Streamlit app and the command line
+
+Nothing in this module imports Streamlit, so it can be used from scripts,
+cron jobs and workers. Errors are raised as MediaDownloaderError
+subclasses instead of being rendered.
+"""
+import yt_dlp
+import os
+import tempfile
+from pathlib import Path
+import time
+import random
+import re
+import json
+import copy
+import hashlib
+import shutil
+import secrets
+import uuid
+import zipfile
+import bisect
+import functools
+from contextlib import contextmanager
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs, urlencode, quote
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import ipaddress
+import socket
+
+try:
+    import fcntl
+except ImportError:  # Windows: the rate limiter stays per-process
+    fcntl = None
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are cached at their original size
+    Image = None
+
+# Cache configuration (overridable through environment variables)
+CACHE_DIR = Path(os.environ.get(
+    'MEDIA_DOWNLOADER_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_downloader_cache')
+))
+METADATA_TTL = int(os.environ.get('MEDIA_DOWNLOADER_METADATA_TTL', 1800))
+METADATA_MEMORY_ENTRIES = int(os.environ.get('MEDIA_DOWNLOADER_METADATA_MEMORY_ENTRIES', 256))
+# Byte cap of the in-memory tier, measured as the JSON size of the cached entries
+METADATA_MEMORY_MB = int(os.environ.get('MEDIA_DOWNLOADER_METADATA_MEMORY_MB', 32))
+METADATA_DISK_ENTRIES = int(os.environ.get('MEDIA_DOWNLOADER_METADATA_DISK_ENTRIES', 5000))
+
+# Disk budget for finished downloads kept in the artifact store
+ARTIFACT_BUDGET_MB = int(os.environ.get('MEDIA_DOWNLOADER_ARTIFACT_BUDGET_MB', 4096))
+
+# Local thumbnail cache: display width (px), in-memory entries, disk budget and how long
+# the UI waits for a background fetch before rendering without the image
+THUMBNAIL_WIDTH = int(os.environ.get('MEDIA_DOWNLOADER_THUMBNAIL_WIDTH', 640))
+THUMBNAIL_MEMORY_ENTRIES = int(os.environ.get('MEDIA_DOWNLOADER_THUMBNAIL_MEMORY_ENTRIES', 128))
+THUMBNAIL_BUDGET_MB = int(os.environ.get('MEDIA_DOWNLOADER_THUMBNAIL_BUDGET_MB', 64))
+THUMBNAIL_WAIT = float(os.environ.get('MEDIA_DOWNLOADER_THUMBNAIL_WAIT', 3))
+THUMBNAIL_FAILURE_TTL = int(os.environ.get('MEDIA_DOWNLOADER_THUMBNAIL_FAILURE_TTL', 600))
+
+# Companion file server that streams large downloads from disk
+FILE_SERVER_HOST = os.environ.get('MEDIA_DOWNLOADER_FILE_SERVER_HOST', '0.0.0.0')
+FILE_SERVER_PORT = int(os.environ.get('MEDIA_DOWNLOADER_FILE_SERVER_PORT', 8502))
+FILE_SERVER_URL = os.environ.get('MEDIA_DOWNLOADER_FILE_SERVER_URL', f'http://localhost:{FILE_SERVER_PORT}')
+FILE_LINK_TTL = int(os.environ.get('MEDIA_DOWNLOADER_FILE_LINK_TTL', 3600))
+
+# Background download workers (per host) and concurrent ffmpeg postprocessing runs
+DOWNLOAD_WORKERS = int(os.environ.get('MEDIA_DOWNLOADER_WORKERS', 4))
+POSTPROCESS_WORKERS = int(os.environ.get(
+    'MEDIA_DOWNLOADER_POSTPROCESS_WORKERS', max(1, (os.cpu_count() or 2) // 2)
+))
+# Seconds a finished job stays queryable
+JOB_RETENTION = int(os.environ.get('MEDIA_DOWNLOADER_JOB_RETENTION', 3600))
+# Resume downloads interrupted by a restart; partial files nobody resumes are swept after PARTIAL_TTL seconds
+RESUME_JOBS = os.environ.get('MEDIA_DOWNLOADER_RESUME_JOBS', '1') == '1'
+PARTIAL_TTL = int(os.environ.get('MEDIA_DOWNLOADER_PARTIAL_TTL', 86400))
+# Disk budget for job working directories (partial files and batch archives)
+WORK_BUDGET_MB = int(os.environ.get('MEDIA_DOWNLOADER_WORK_BUDGET_MB', 2048))
+
+# Batch mode: global and per-domain concurrency, retries and playlist size cap
+BATCH_CONCURRENCY = int(os.environ.get('MEDIA_DOWNLOADER_BATCH_CONCURRENCY', 4))
+BATCH_PER_DOMAIN = int(os.environ.get('MEDIA_DOWNLOADER_BATCH_PER_DOMAIN', 2))
+BATCH_RETRIES = int(os.environ.get('MEDIA_DOWNLOADER_BATCH_RETRIES', 3))
+BATCH_BACKOFF = float(os.environ.get('MEDIA_DOWNLOADER_BATCH_BACKOFF', 2.0))
+BATCH_MAX_ITEMS = int(os.environ.get('MEDIA_DOWNLOADER_BATCH_MAX_ITEMS', 500))
+
+# Per-host token bucket: sustained requests per second, burst size and backoff cap.
+# Set MEDIA_DOWNLOADER_RATE_LIMIT_SHARED=1 to share buckets between processes.
+RATE_LIMIT_RATE = float(os.environ.get('MEDIA_DOWNLOADER_RATE_LIMIT', 1.0))
+RATE_LIMIT_BURST = float(os.environ.get('MEDIA_DOWNLOADER_RATE_LIMIT_BURST', 5))
+RATE_LIMIT_MAX_BACKOFF = float(os.environ.get('MEDIA_DOWNLOADER_RATE_LIMIT_MAX_BACKOFF', 120))
+RATE_LIMIT_SHARED = os.environ.get('MEDIA_DOWNLOADER_RATE_LIMIT_SHARED', '0') == '1'
+
+# Download acceleration: concurrent fragments and chunked range requests, tuned per host
+ACCELERATION = os.environ.get('MEDIA_DOWNLOADER_ACCELERATION', '1') == '1'
+ACCEL_START_CONNECTIONS = int(os.environ.get('MEDIA_DOWNLOADER_ACCEL_START_CONNECTIONS', 2))
+ACCEL_MAX_CONNECTIONS = int(os.environ.get('MEDIA_DOWNLOADER_ACCEL_MAX_CONNECTIONS', 16))
+ACCEL_CONNECTION_BUDGET = int(os.environ.get('MEDIA_DOWNLOADER_ACCEL_CONNECTION_BUDGET', 32))
+# Doubling connections must improve throughput by at least this fraction to continue
+ACCEL_MIN_GAIN = float(os.environ.get('MEDIA_DOWNLOADER_ACCEL_MIN_GAIN', 0.15))
+ACCEL_HTTP_CHUNK_MB = int(os.environ.get('MEDIA_DOWNLOADER_ACCEL_HTTP_CHUNK_MB', 10))
+# Use aria2c for multi-connection progressive downloads when it is installed
+ACCEL_ARIA2C = os.environ.get('MEDIA_DOWNLOADER_ARIA2C', '0') == '1'
+
+# Maximum number of extraction strategies raced at the same time
+STRATEGY_CONCURRENCY = int(os.environ.get('MEDIA_DOWNLOADER_STRATEGY_CONCURRENCY', 2))
+# Adaptive strategy ranking: half-life of the per-platform stats (seconds), failures in a row
+# before a strategy is dropped, and seconds before a dropped strategy gets another try
+STRATEGY_HALF_LIFE = float(os.environ.get('MEDIA_DOWNLOADER_STRATEGY_HALF_LIFE', 3 * 86400))
+STRATEGY_DROP_AFTER = int(os.environ.get('MEDIA_DOWNLOADER_STRATEGY_DROP_AFTER', 5))
+STRATEGY_RETRY_AFTER = float(os.environ.get('MEDIA_DOWNLOADER_STRATEGY_RETRY_AFTER', 6 * 3600))
+
+class MediaDownloaderError(Exception):
+    """Base class for errors raised by the download engine"""
+
+
+class AnalysisError(MediaDownloaderError):
+    """Every extraction method failed for a URL; errors maps method names to exceptions"""
+
+    def __init__(self, url, errors):
+        self.url = url
+        self.errors = errors
+        details = "; ".join(f"{method}: {error}" for method, error in errors.items())
+        super().__init__(details or f"No media information found for {url}")
+
+    @property
+    def bot_detection(self):
+        return any("Sign in to confirm" in str(error) for error in self.errors.values())
+
+
+class DownloadFailedError(MediaDownloaderError):
+    """A download finished without producing a file"""
+
+
+# Structured results of MediaDownloader.get_video_info and download_media
+AnalysisResult = namedtuple('AnalysisResult', 'method opts video_info')
+DownloadResult = namedtuple('DownloadResult', 'url path size')
+
+
+# Choices offered for each format type, shared by the web UI and the CLI
+VIDEO_QUALITIES = ["Best", "1080p", "720p", "480p", "360p", "Worst"]
+VIDEO_FORMATS = ["Original", "MP4", "WEBM"]
+AUDIO_QUALITIES = ["320", "256", "192", "128", "96"]
+AUDIO_FORMATS = ["MP3", "AAC", "OGG"]
+
+YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([0-9A-Za-z_-]{11})'
+)
+# Info dict fields that are never needed to re-run format selection and download
+HEAVY_INFO_KEYS = (
+    'automatic_captions', 'subtitles', 'requested_subtitles', 'heatmap',
+    'thumbnails', 'description', 'requested_formats', 'requested_downloads',
+)
+TRACKING_PARAMS = {'t', 'si', 'feature', 'fbclid', 'igshid', 'ref', 'start'}
+
+
+def canonical_media_id(url):
+    """Return a stable cache key for a media URL"""
+    match = YOUTUBE_ID_PATTERN.search(url)
+    if match:
+        return f"youtube:{match.group(1)}"
+
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = {
+        key: values for key, values in parse_qs(parsed.query).items()
+        if key not in TRACKING_PARAMS and not key.startswith('utm_')
+    }
+    canonical = f"{host}{parsed.path.rstrip('/')}"
+    if query:
+        canonical += '?' + urlencode(sorted(query.items()), doseq=True)
+    return canonical
+
+
+def media_host(url):
+    """Return the host used for rate limiting and per-domain scheduling"""
+    if YOUTUBE_ID_PATTERN.search(url):
+        return 'youtube.com'
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def pick_thumbnail(info, width=THUMBNAIL_WIDTH):
+    """Return the smallest thumbnail URL at least width pixels wide, else yt-dlp's own pick"""
+    thumbnails = [thumbnail for thumbnail in info.get('thumbnails') or [] if thumbnail.get('url')]
+    wide_enough = [thumbnail for thumbnail in thumbnails if (thumbnail.get('width') or 0) >= width]
+    if wide_enough:
+        return min(wide_enough, key=lambda thumbnail: thumbnail['width'])['url']
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    return thumbnails[-1]['url'] if thumbnails else ''
+
+
+def is_expired_url_error(error):
+    """Whether a download failed because the analyzed stream URLs expired (HTTP 403/410)"""
+    return bool(re.search(r'HTTP Error (?:403|410)\b', str(error)))
+
+
+def is_throttle_error(error):
+    """Whether an extraction/download error means the host is throttling us"""
+    # Match the status itself: media IDs in error messages often contain "429"
+    return bool(re.search(r'HTTP Error 429\b|Too Many Requests|Sign in to confirm', str(error)))
+
+
+# Host suffix -> prefix of the yt-dlp extractor keys serving it, one entry per supported site.
+# URLs on other hosts go through yt-dlp's full extractor scan as before.
+EXTRACTOR_ROUTES = {
+    'youtube.com': 'Youtube', 'youtu.be': 'Youtube', 'youtube-nocookie.com': 'Youtube',
+    'vimeo.com': 'Vimeo',
+    'facebook.com': 'Facebook', 'fb.watch': 'Facebook',
+    'instagram.com': 'Instagram',
+    'twitter.com': 'Twitter', 'x.com': 'Twitter', 't.co': 'Twitter',
+    'tiktok.com': 'TikTok',
+    'dailymotion.com': 'Dailymotion', 'dai.ly': 'Dailymotion',
+    'twitch.tv': 'Twitch',
+    'reddit.com': 'Reddit', 'redd.it': 'Reddit',
+    'soundcloud.com': 'Soundcloud',
+    'bandcamp.com': 'Bandcamp',
+}
+YOUTUBE_URL_PATTERN = re.compile(r'youtube\.com/watch|youtu\.be/|youtube\.com/shorts')
+
+ExtractorRoute = namedtuple('ExtractorRoute', 'ie_key allowed_extractors')
+
+
+class ExtractorRouter:
+    """Host -> extractor routing table built once per process
+    
+    yt-dlp tries the URL pattern of every one of its ~1800 extractors, in
+    order, and compiles each pattern on first use. The router narrows that
+    to the family registered for the URL's host, with the patterns compiled
+    up front, so YoutubeDL can be created with only that family loaded
+    (allowed_extractors) and the matching extractor pinned (ie_key).
+    """
+
+    def __init__(self, routes=EXTRACTOR_ROUTES):
+        from yt_dlp.extractor import gen_extractor_classes
+
+        prefixes = set(routes.values())
+        families = {prefix: [] for prefix in prefixes}
+        # Keep yt-dlp's own order so the first suitable extractor is the one it would pick
+        for ie in gen_extractor_classes():
+            prefix = next((prefix for prefix in prefixes if ie.ie_key().startswith(prefix)), None)
+            if prefix:
+                ie.suitable('')  # compiles _VALID_URL now instead of on the first request
+                families[prefix].append(ie)
+
+        self._routes = {host: families[prefix] for host, prefix in routes.items() if families[prefix]}
+        self._allowed = {
+            prefix: [re.escape(ie.IE_NAME) for ie in family] for prefix, family in families.items()
+        }
+        self._prefixes = dict(routes)
+        self.hits = 0
+        self.misses = 0
+
+    def route(self, url):
+        """Return the ExtractorRoute for url, or None when its host is not in the table"""
+        labels = (urlparse(url).hostname or '').lower().split('.')
+        for start in range(len(labels) - 1):
+            host = '.'.join(labels[start:])
+            family = self._routes.get(host)
+            if family:
+                ie = next((ie for ie in family if ie.suitable(url)), None)
+                if ie:
+                    self.hits += 1
+                    return ExtractorRoute(ie.ie_key(), self._allowed[self._prefixes[host]])
+                break
+        self.misses += 1
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_extractor_router():
+    """Process-wide extractor routing table"""
+    return ExtractorRouter()
+
+
+def is_unroutable_error(error):
+    """Whether a pinned extraction failed because the page hands off to an extractor outside its family"""
+    return 'No suitable extractor' in str(error)
+
+
+# Codecs each video container can hold without re-encoding: (video codecs, audio codecs)
+VIDEO_CONTAINER_CODECS = {
+    'mp4': ({'avc1', 'h264', 'hev1', 'hvc1', 'h265', 'av01'}, {'mp4a', 'aac', 'mp3'}),
+    'webm': ({'vp8', 'vp9', 'av01'}, {'opus', 'vorbis'}),
+}
+# Audio outputs: source codec -> yt-dlp preferredcodec that stream-copies it
+AUDIO_COPY_CODECS = {
+    'mp3': {'mp3': 'mp3'},
+    'aac': {'mp4a': 'm4a', 'aac': 'm4a'},
+    # Opus would come out as .opus, so only Vorbis is copied into .ogg
+    'ogg': {'vorbis': 'vorbis'},
+}
+# Source extensions that already are the requested audio output
+AUDIO_NATIVE_EXTS = {'mp3': ('mp3',), 'aac': ('m4a',), 'ogg': ('ogg',)}
+# preferredcodec used when the audio has to be re-encoded
+AUDIO_TRANSCODE_CODECS = {'mp3': 'mp3', 'aac': 'm4a', 'ogg': 'vorbis'}
+
+
+def codec_name(codec):
+    """Normalize a yt-dlp codec string ('avc1.64001F', 'vp09.00.40.08') to its family"""
+    if not codec:
+        return None
+    codec = codec.lower().split('.')[0]
+    return {'vp09': 'vp9', 'avc3': 'avc1'}.get(codec, codec)
+
+
+class FormatRecord(namedtuple('FormatRecord', 'format_id ext height fps vcodec acodec tbr abr filesize')):
+    """Compact, immutable view of a single yt-dlp format"""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_format(cls, fmt, duration=None):
+        tbr = fmt.get('tbr') or 0
+        filesize = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not filesize and tbr and duration:
+            filesize = int(tbr * 1000 / 8 * duration)
+        return cls(
+            fmt['format_id'],
+            fmt.get('ext'),
+            fmt.get('height') or 0,
+            fmt.get('fps') or 0,
+            'none' if fmt.get('vcodec') == 'none' else codec_name(fmt.get('vcodec')),
+            'none' if fmt.get('acodec') == 'none' else codec_name(fmt.get('acodec')),
+            tbr,
+            fmt.get('abr') or tbr,
+            filesize,
+        )
+
+    @property
+    def has_video(self):
+        return self.vcodec != 'none'
+
+    @property
+    def label(self):
+        return f"{self.height}p" if self.height else "source"
+
+    @property
+    def has_audio(self):
+        return self.acodec != 'none'
+
+    def fits(self, container):
+        """Whether this format can go into container without re-encoding"""
+        video_codecs, audio_codecs = VIDEO_CONTAINER_CODECS[container]
+        if self.vcodec is None and self.acodec is None:
+            # Codecs unknown (e.g. direct file links): trust the extension
+            return self.ext == container
+        video_ok = not self.has_video or self.vcodec in video_codecs
+        audio_ok = not self.has_audio or self.acodec in audio_codecs
+        return video_ok and audio_ok
+
+
+def format_records(formats, duration=None):
+    """Compact FormatRecords for every selectable format"""
+    return tuple(FormatRecord.from_format(f, duration) for f in formats if f.get('format_id'))
+
+
+class FormatIndex:
+    """Sorted index over an analyzed formats list
+    
+    Video formats (progressive and video-only) are kept in lists sorted by
+    (height, fps, bitrate), one for every container they fit without
+    re-encoding, so "best video up to N p" is a bisect. Audio-only formats
+    are grouped by codec and sorted by bitrate.
+    """
+
+    def __init__(self, records, duration=None):
+        self.duration = duration
+        self._videos = {}
+        self._heights = {}
+        self._audios = {}
+
+        rank = lambda record: (record.height, record.fps, record.tbr)
+        for record in sorted((r for r in records if r.has_video), key=rank):
+            families = ['any'] + [c for c in VIDEO_CONTAINER_CODECS if record.fits(c)]
+            for family in families:
+                self._videos.setdefault(family, []).append(record)
+                self._heights.setdefault(family, []).append(record.height)
+        for record in sorted((r for r in records if r.has_audio and not r.has_video), key=lambda r: r.abr):
+            self._audios.setdefault(record.acodec, []).append(record)
+
+    @classmethod
+    def from_formats(cls, formats, duration=None):
+        """Build an index straight from a yt-dlp formats list"""
+        return cls(format_records(formats, duration), duration)
+
+    def __len__(self):
+        return len(self._videos.get('any', [])) + sum(len(group) for group in self._audios.values())
+
+    def best_video(self, max_height=None, container='any', worst=False):
+        """Best (or worst) video format no taller than max_height that fits container"""
+        videos = self._videos.get(container)
+        if not videos:
+            return None
+        if worst:
+            return videos[0]
+        end = len(videos) if max_height is None else bisect.bisect_right(self._heights[container], max_height)
+        return videos[end - 1] if end else None
+
+    def best_audio(self, codecs=None, worst=False):
+        """Highest (or lowest) bitrate audio-only format among codecs (all codecs if None)"""
+        groups = [group for codec, group in self._audios.items() if codecs is None or codec in codecs]
+        if not groups:
+            return None
+        if worst:
+            return min((group[0] for group in groups), key=lambda r: r.abr)
+        return max((group[-1] for group in groups), key=lambda r: r.abr)
+
+    def audio_near(self, bitrate, codecs=None):
+        """Lowest-bitrate audio-only format at or above bitrate, else the highest below it"""
+        candidates = [r for codec, group in self._audios.items() if codecs is None or codec in codecs for r in group]
+        above = [r for r in candidates if r.abr >= bitrate]
+        if above:
+            return min(above, key=lambda r: r.abr)
+        return max(candidates, key=lambda r: r.abr, default=None)
+
+    def audio_for(self, video, container=None, worst=False):
+        """Audio to pair with a video-only format, preferring the given container"""
+        if video.has_audio:
+            return None
+        for family in ([container] if container in VIDEO_CONTAINER_CODECS else []) + \
+                [c for c in VIDEO_CONTAINER_CODECS if video.fits(c)]:
+            audio = self.best_audio(VIDEO_CONTAINER_CODECS[family][1], worst)
+            if audio:
+                return audio
+        return self.best_audio(worst=worst)
+
+
+class VideoInfo:
+    """Slim per-session view of an analyzed video
+    
+    Only the fields the UI and format planning need are kept, and formats
+    are stored as compact FormatRecord tuples. The full info dict (stream
+    URLs, headers, fragment lists) stays in the shared metadata cache and
+    is loaded on demand when a download starts.
+    """
+
+    __slots__ = (
+        'media_id', 'title', 'duration', 'uploader', 'view_count', 'upload_date',
+        'thumbnail', 'platform', 'method', 'formats', '_format_index',
+    )
+
+    def __init__(self, media_id, title, duration, uploader, view_count, upload_date,
+                 thumbnail, platform, method, formats):
+        self.media_id = media_id
+        self.title = title
+        self.duration = duration
+        self.uploader = uploader
+        self.view_count = view_count
+        self.upload_date = upload_date
+        self.thumbnail = thumbnail
+        self.platform = platform
+        self.method = method
+        self.formats = formats
+        self._format_index = None
+
+    @property
+    def format_index(self):
+        """FormatIndex over the compact records, built on first use"""
+        if self._format_index is None:
+            self._format_index = FormatIndex(self.formats, self.duration)
+        return self._format_index
+
+
+def selection_size(*records):
+    """Estimated combined size of the selected formats, or None if unknown"""
+    sizes = [record.filesize for record in records if record]
+    return sum(sizes) if sizes and all(sizes) else None
+
+
+class ClipRange(namedtuple('ClipRange', 'start end precise')):
+    """Time range to download instead of the whole media; end None means until the end"""
+
+    __slots__ = ()
+
+    @staticmethod
+    def timestamp(seconds, delim=':'):
+        if seconds is None:
+            return "end"
+        hours, rest = divmod(int(seconds), 3600)
+        minutes, secs = divmod(rest, 60)
+        if hours:
+            return f"{hours}{delim}{minutes:02d}{delim}{secs:02d}"
+        return f"{minutes}{delim}{secs:02d}"
+
+    @property
+    def label(self):
+        return f"{self.timestamp(self.start)}–{self.timestamp(self.end)}"
+
+    @property
+    def file_label(self):
+        return f"{self.timestamp(self.start, '.')}-{self.timestamp(self.end, '.')}"
+
+    def length(self, duration=None):
+        end = self.end if self.end is not None else duration
+        return end - self.start if end is not None else None
+
+    def download_ranges(self):
+        """yt-dlp download_ranges callback covering this clip"""
+        end = self.end if self.end is not None else float('inf')
+        return yt_dlp.utils.download_range_func(None, [(self.start, end)])
+
+
+def parse_clip_range(start_text, end_text, duration=None, precise=False):
+    """Parse start/end inputs ('90', '1:30', '1h2m') into a ClipRange
+    
+    Returns None when the range covers the whole media and raises
+    ValueError for unparseable or empty ranges.
+    """
+    start_text, end_text = (start_text or '').strip(), (end_text or '').strip()
+    start = yt_dlp.utils.parse_duration(start_text) if start_text else 0.0
+    end = yt_dlp.utils.parse_duration(end_text) if end_text else None
+    if start is None:
+        raise ValueError(f"Invalid start time: {start_text}")
+    if end_text and end is None:
+        raise ValueError(f"Invalid end time: {end_text}")
+    if end is not None and end <= start:
+        raise ValueError("End time must be after the start time")
+    if duration and start >= duration:
+        raise ValueError("Start time is past the end of the media")
+    if duration and end is not None and end >= duration:
+        end = None
+    if not start and end is None:
+        return None
+    return ClipRange(float(start), float(end) if end is not None else None, precise)
+
+
+def plan_conversion(index, format_type, quality, output_format, clip=None):
+    """Choose exact source formats and the cheapest way to reach the requested output
+    
+    Returns a dict with the yt-dlp 'format' selector, the 'postprocessors'
+    to run, an optional 'merge_output_format', the 'estimated_size' and the
+    'path' taken: 'copy' (no ffmpeg pass), 'remux' (ffmpeg stream copy or
+    merge into another container) or 'transcode' (re-encode). 'exact' is
+    False when there was no format information and yt-dlp's own selection
+    is used instead.
+    """
+    if format_type == "Audio":
+        plan = plan_audio_conversion(index, output_format.lower(), quality)
+    else:
+        plan = plan_video_conversion(index, output_format.lower(), quality)
+    plan['exact'] = len(index) > 0
+    return plan_clip(plan, clip, index.duration) if clip else plan
+
+
+def plan_clip(plan, clip, duration):
+    """Scale a plan down to a clip: only the covered fragments or byte ranges are fetched"""
+    length = clip.length(duration)
+    if plan['estimated_size'] and length is not None and duration:
+        plan['estimated_size'] = int(plan['estimated_size'] * length / duration)
+    if clip.precise:
+        # Exact cuts need new keyframes, so the clip is re-encoded
+        plan['path'] = 'transcode'
+        plan['description'] += f" · clip {clip.label}, re-encoded for exact cuts"
+    else:
+        plan['description'] += f" · clip {clip.label}, cut at the nearest keyframes"
+    return plan
+
+
+def plan_video_conversion(index, target, quality):
+    worst = quality == "Worst"
+    height_cap = int(quality[:-1]) if quality not in ("Best", "Worst") else None
+
+    best = index.best_video(height_cap, worst=worst)
+    if not best:
+        # No format information: fall back to yt-dlp's own selection
+        selector = 'worst' if worst else 'best' if height_cap is None else f'best[height<={height_cap}]'
+        if target == 'original':
+            return {'format': selector, 'postprocessors': [], 'path': 'copy',
+                    'estimated_size': None, 'description': "Original container, no conversion"}
+        return {'format': selector, 'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': target}],
+                'path': 'transcode', 'estimated_size': None,
+                'description': f"Converting to {target.upper()} (no format information)"}
+
+    if target == 'original':
+        audio = index.audio_for(best, worst=worst)
+        return {'format': f"{best.format_id}+{audio.format_id}" if audio else best.format_id,
+                'postprocessors': [], 'path': 'copy', 'estimated_size': selection_size(best, audio),
+                'description': f"{best.label} in its original container, no conversion"}
+
+    fitting = index.best_video(height_cap, container=target, worst=worst)
+    if fitting and fitting.height == best.height:
+        audio = index.audio_for(fitting, container=target, worst=worst)
+        size = selection_size(fitting, audio)
+        if audio and audio.fits(target):
+            return {'format': f"{fitting.format_id}+{audio.format_id}", 'postprocessors': [],
+                    'merge_output_format': target, 'path': 'remux', 'estimated_size': size,
+                    'description': f"Merging {fitting.label} video and audio into {target.upper()} without re-encoding"}
+        if not audio and fitting.ext == target:
+            return {'format': fitting.format_id, 'postprocessors': [], 'path': 'copy', 'estimated_size': size,
+                    'description': f"Source is already {fitting.label} {target.upper()}, no conversion"}
+        if not audio:
+            return {'format': fitting.format_id,
+                    'postprocessors': [{'key': 'FFmpegVideoRemuxer', 'preferedformat': target}],
+                    'path': 'remux', 'estimated_size': size,
+                    'description': f"Remuxing {fitting.label} {fitting.ext} into {target.upper()} without re-encoding"}
+
+    audio = index.audio_for(best, container=target, worst=worst)
+    plan = {'format': f"{best.format_id}+{audio.format_id}" if audio else best.format_id,
+            'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': target}],
+            'path': 'transcode', 'estimated_size': selection_size(best, audio),
+            'description': f"Re-encoding {best.label} {best.ext} to {target.upper()} (no compatible source)"}
+    if audio:
+        plan['merge_output_format'] = 'mkv'
+    return plan
+
+
+def audio_quality_for(bitrate):
+    """The AUDIO_QUALITIES entry closest to a source bitrate, or None if it is unknown"""
+    if not bitrate:
+        return None
+    return min(AUDIO_QUALITIES, key=lambda quality: abs(int(quality) - bitrate))
+
+
+def plan_audio_conversion(index, target, quality):
+    transcode = {
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': AUDIO_TRANSCODE_CODECS.get(target, target),
+        'preferredquality': quality,
+    }
+    best = index.best_audio()
+    if not best:
+        return {'format': 'bestaudio/best', 'postprocessors': [transcode], 'path': 'transcode',
+                'estimated_size': None,
+                'description': f"Extracting {target.upper()} audio (no format information)"}
+
+    # Copy only a source whose bitrate belongs to the requested quality, so
+    # each quality gets its own file and no source is stored under several
+    copy_codecs = AUDIO_COPY_CODECS.get(target, {})
+    fmt = index.audio_near(int(quality), copy_codecs)
+    if fmt and audio_quality_for(fmt.abr) == quality:
+        if fmt.ext in AUDIO_NATIVE_EXTS.get(target, ()):
+            return {'format': fmt.format_id, 'postprocessors': [], 'path': 'copy',
+                    'estimated_size': fmt.filesize,
+                    'description': f"Source is already {target.upper()}, no conversion"}
+        return {'format': fmt.format_id,
+                'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': copy_codecs[fmt.acodec]}],
+                'path': 'remux', 'estimated_size': fmt.filesize,
+                'description': f"Copying {fmt.acodec} audio out of {fmt.ext} without re-encoding"}
+
+    source = index.audio_near(int(quality))
+    reason = f"no {quality} kbps source" if fmt else "no compatible source"
+    duration = index.duration
+    return {'format': source.format_id, 'postprocessors': [transcode], 'path': 'transcode',
+            'estimated_size': int(int(quality) * 1000 / 8 * duration) if duration else None,
+            'description': f"Re-encoding {source.acodec} audio to {target.upper()} at {quality} kbps ({reason})"}
+
+
+class MetadataCache:
+    """Two-tier (in-memory LRU + SQLite) cache for analyzed video info
+    
+    The memory tier is capped both by entry count and by the JSON size of
+    its entries, so a few huge info dicts cannot pin hundreds of MB.
+    """
+
+    def __init__(self, db_path, ttl=METADATA_TTL, memory_entries=METADATA_MEMORY_ENTRIES,
+                 disk_entries=METADATA_DISK_ENTRIES, memory_bytes=METADATA_MEMORY_MB * 1024 * 1024):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.disk_entries = disk_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS video_info (
+                media_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def get(self, media_id):
+        """Return the cached entry for media_id, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(media_id)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > now:
+                    self._memory.move_to_end(media_id)
+                    self.memory_hits += 1
+                    return value
+                self._forget(media_id)
+
+            row = self._db.execute(
+                "SELECT payload, expires_at FROM video_info WHERE media_id = ?", (media_id,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._db.execute("DELETE FROM video_info WHERE media_id = ?", (media_id,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE video_info SET last_access = ? WHERE media_id = ?", (now, media_id)
+            )
+            self._db.commit()
+            value = json.loads(row[0])
+            self._remember(media_id, row[1], value, len(row[0]))
+            self.disk_hits += 1
+            return value
+
+    def set(self, media_id, value):
+        """Store value in both tiers and enforce the size caps"""
+        now = time.time()
+        expires_at = now + self.ttl
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            self._remember(media_id, expires_at, value, len(payload))
+            self._db.execute(
+                "INSERT OR REPLACE INTO video_info VALUES (?, ?, ?, ?)",
+                (media_id, payload, expires_at, now)
+            )
+            self._db.execute("DELETE FROM video_info WHERE expires_at <= ?", (now,))
+            self._db.execute("""
+                DELETE FROM video_info WHERE media_id IN (
+                    SELECT media_id FROM video_info ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.disk_entries,))
+            self._db.commit()
+
+    def _remember(self, media_id, expires_at, value, size):
+        self._forget(media_id)
+        if size > self.memory_bytes:
+            # Too big for the memory tier; it is still served from disk
+            return
+        self._memory[media_id] = (expires_at, value, size)
+        self._memory_size += size
+        while len(self._memory) > self.memory_entries or self._memory_size > self.memory_bytes:
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+
+    def _forget(self, media_id):
+        entry = self._memory.pop(media_id, None)
+        if entry is not None:
+            self._memory_size -= entry[2]
+
+    def stats(self):
+        """Return hit/miss counters and current tier sizes"""
+        with self._lock:
+            disk_size = self._db.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_entries': disk_size,
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def get_metadata_cache():
+    """Process-wide metadata cache shared by every session"""
+    return MetadataCache(CACHE_DIR / 'metadata.sqlite3')
+
+
+class ArtifactStore:
+    """Disk-budgeted LRU store of finished downloads with single-flight deduplication
+    
+    Each artifact lives in its own directory named after the hash of its key.
+    Directory mtimes record the last use, so LRU order survives restarts.
+    """
+
+    def __init__(self, root, budget_bytes):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, *parts):
+        """Hash the request parameters into an artifact key"""
+        return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def lookup(self, key):
+        """Return the stored file for key, marking it as recently used"""
+        artifact_dir = self.root / key
+        files = [path for path in artifact_dir.glob('*') if path.is_file()] if artifact_dir.is_dir() else []
+        if not files:
+            return None
+        now = time.time()
+        os.utime(artifact_dir, (now, now))
+        return str(files[0])
+
+    def get_or_create(self, key, producer):
+        """Return the artifact for key, running producer at most once per key
+        
+        Concurrent callers with the same key wait for the first caller's
+        producer instead of starting their own download. producer returns
+        (path, store_key); a result stored under another key is handed to
+        the callers but never served for key.
+        """
+        path = self.lookup(key)
+        if path:
+            self.hits += 1
+            return path
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            self.shared += 1
+            return future.result()
+
+        try:
+            path = self.lookup(key)
+            if path:
+                self.hits += 1
+            else:
+                self.misses += 1
+                produced, store_key = producer()
+                path = self.add(store_key, produced) if produced else None
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def add(self, key, source_path):
+        """Move a finished file into the store and enforce the disk budget"""
+        artifact_dir = self.root / key
+        artifact_dir.mkdir(parents=True, exist_ok=True)
+        target = artifact_dir / Path(source_path).name
+        shutil.move(source_path, target)
+        self.evict(keep=key)
+        return str(target)
+
+    def evict(self, keep=None):
+        """Remove least recently used artifacts until the store fits its budget"""
+        entries = []
+        total = 0
+        for artifact_dir in self.root.iterdir():
+            if not artifact_dir.is_dir():
+                continue
+            size = sum(path.stat().st_size for path in artifact_dir.glob('*') if path.is_file())
+            entries.append((artifact_dir.stat().st_mtime, size, artifact_dir))
+            total += size
+
+        for _, size, artifact_dir in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if artifact_dir.name == keep:
+                continue
+            shutil.rmtree(artifact_dir, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        """Return hit/miss counters"""
+        return {'hits': self.hits, 'misses': self.misses, 'shared': self.shared}
+
+
+@functools.lru_cache(maxsize=None)
+def get_artifact_store():
+    """Process-wide store of finished downloads shared by every session"""
+    return ArtifactStore(CACHE_DIR / 'artifacts', ARTIFACT_BUDGET_MB * 1024 * 1024)
+
+
+def check_public_url(url):
+    """Raise ValueError unless url is http(s) and its host resolves only to public addresses"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError(f"Refusing to fetch {url!r}: only http and https URLs are allowed")
+    try:
+        addresses = socket.getaddrinfo(parsed.hostname, parsed.port or None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ValueError(f"Cannot resolve {parsed.hostname}: {e}") from e
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if not address.is_global:
+            raise ValueError(f"Refusing to fetch {url!r}: {address} is not a public address")
+
+
+class PublicRedirectHandler(HTTPRedirectHandler):
+    """Follow redirects only to URLs that pass check_public_url"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class ThumbnailCache:
+    """Bounded memory + disk cache of downscaled thumbnails, keyed by media ID
+    
+    prefetch() fetches and downscales a thumbnail on a background thread
+    (once per media ID, however many sessions ask); get() returns the JPEG
+    bytes so the UI serves the image itself instead of hot-linking it on
+    every rerun. Disk files are evicted least recently used first. Failed
+    fetches are remembered for failure_ttl seconds so reruns do not retry
+    them, and only public http(s) hosts are ever contacted.
+    """
+
+    max_fetch_bytes = 10 * 1024 * 1024
+    fetch_timeout = 15
+    user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+
+    def __init__(self, root, width=THUMBNAIL_WIDTH, memory_entries=THUMBNAIL_MEMORY_ENTRIES,
+                 budget_bytes=THUMBNAIL_BUDGET_MB * 1024 * 1024, failure_ttl=THUMBNAIL_FAILURE_TTL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.width = width
+        self.memory_entries = memory_entries
+        self.budget_bytes = budget_bytes
+        self.failure_ttl = failure_ttl
+        self.hits = 0
+        self.fetches = 0
+        self.failures = 0
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnail')
+        self._opener = build_opener(PublicRedirectHandler)
+
+    def path_for(self, media_id):
+        return self.root / f"{hashlib.sha1(media_id.encode()).hexdigest()}.jpg"
+
+    def prefetch(self, media_id, url):
+        """Start fetching the thumbnail of media_id in the background unless it is cached"""
+        if not url or not media_id:
+            return
+        with self._lock:
+            if media_id in self._memory or media_id in self._inflight or self._recently_failed(media_id):
+                return
+            if self.path_for(media_id).exists():
+                return
+            future = self._executor.submit(self.fetch, media_id, url)
+            self._inflight[media_id] = future
+        future.add_done_callback(lambda _: self._finish(media_id))
+
+    def _finish(self, media_id):
+        with self._lock:
+            self._inflight.pop(media_id, None)
+
+    def _recently_failed(self, media_id):
+        expires_at = self._failed.get(media_id)
+        if expires_at is None:
+            return False
+        if expires_at > time.time():
+            return True
+        del self._failed[media_id]
+        return False
+
+    def _record_failure(self, media_id):
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            for expired in [key for key, expires_at in self._failed.items() if expires_at <= now]:
+                del self._failed[expired]
+            self._failed[media_id] = now + self.failure_ttl
+
+    def pending(self, media_id):
+        """Whether a background fetch for media_id is still running"""
+        with self._lock:
+            return media_id in self._inflight
+
+    def get(self, media_id, wait=0):
+        """Return the cached JPEG bytes, waiting up to wait seconds for a running fetch"""
+        with self._lock:
+            data = self._memory.get(media_id)
+            if data is not None:
+                self._memory.move_to_end(media_id)
+                self.hits += 1
+                return data
+            future = self._inflight.get(media_id)
+            if future is None and self._recently_failed(media_id):
+                return None
+
+        if future is not None:
+            try:
+                return future.result(timeout=wait)
+            except Exception:
+                return None
+
+        path = self.path_for(media_id)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        with self._lock:
+            self.hits += 1
+            self._remember(media_id, data)
+        return data
+
+    def fetch(self, media_id, url):
+        """Download, downscale and store one thumbnail; return its bytes or None"""
+        with self._lock:
+            self.fetches += 1
+        try:
+            # The URL comes from the extractor, so never let it reach internal hosts
+            check_public_url(url)
+            request = Request(url, headers={'User-Agent': self.user_agent})
+            with self._opener.open(request, timeout=self.fetch_timeout) as response:
+                data = response.read(self.max_fetch_bytes + 1)
+            if len(data) > self.max_fetch_bytes:
+                raise ValueError(f"Thumbnail larger than {self.max_fetch_bytes} bytes")
+            data = self.downscale(data)
+        except Exception:
+            self._record_failure(media_id)
+            return None
+
+        path = self.path_for(media_id)
+        temp_path = path.with_suffix('.tmp')
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._remember(media_id, data)
+        self.evict(keep=path)
+        return data
+
+    def downscale(self, data):
+        """Re-encode an image as a JPEG no wider or taller than the display width"""
+        if Image is None:
+            return data
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((self.width, self.width))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+        return output.getvalue()
+
+    def _remember(self, media_id, data):
+        self._memory[media_id] = data
+        self._memory.move_to_end(media_id)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def evict(self, keep=None):
+        """Remove least recently used thumbnails until the disk cache fits its budget"""
+        entries = []
+        total = 0
+        for path in self.root.glob('*.jpg'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        """Return hit/fetch counters and the number of thumbnails held in memory"""
+        with self._lock:
+            return {
+                'hits': self.hits, 'fetches': self.fetches,
+                'failures': self.failures, 'memory_entries': len(self._memory),
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def get_thumbnail_cache():
+    """Process-wide thumbnail cache shared by every session"""
+    return ThumbnailCache(CACHE_DIR / 'thumbnails')
+
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    """Serve registered files in chunks with single-range support"""
+
+    def do_HEAD(self):
+        self.serve_file(send_body=False)
+
+    def do_GET(self):
+        self.serve_file(send_body=True)
+
+    def serve_file(self, send_body):
+        parts = self.path.split('/')
+        path = self.server.resolve(parts[2]) if len(parts) >= 3 and parts[1] == 'files' else None
+        if not path or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        file_size = os.path.getsize(path)
+        start, end = 0, file_size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = RANGE_PATTERN.match(range_header.strip())
+            if not match or (not match.group(1) and not match.group(2)):
+                self.send_error(416)
+                return
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), file_size - 1)
+            else:
+                start = max(0, file_size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{file_size}')
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header(
+            'Content-Disposition',
+            f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}"
+        )
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+        self.end_headers()
+
+        if send_body and length > 0:
+            self.wfile.flush()
+            with open(path, 'rb') as f:
+                # socket.sendfile streams from the page cache without buffering the file
+                self.connection.sendfile(f, offset=start, count=length)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FileServer(ThreadingHTTPServer):
+    """Companion HTTP server that streams finished downloads from disk"""
+
+    daemon_threads = True
+
+    def __init__(self, host, port, public_url, link_ttl=FILE_LINK_TTL):
+        super().__init__((host, port), FileRequestHandler)
+        self.public_url = public_url.rstrip('/')
+        self.link_ttl = link_ttl
+        self._links = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def register(self, path):
+        """Return a temporary download URL for path"""
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        with self._lock:
+            self._links = {
+                key: value for key, value in self._links.items() if value[1] > now
+            }
+            self._links[token] = (os.path.abspath(path), now + self.link_ttl)
+        return f"{self.public_url}/files/{token}/{quote(os.path.basename(path))}"
+
+    def resolve(self, token):
+        """Return the file registered under token, if the link is still valid"""
+        with self._lock:
+            entry = self._links.get(token)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_file_server():
+    """Process-wide file server, started on first use"""
+    return FileServer(FILE_SERVER_HOST, FILE_SERVER_PORT, FILE_SERVER_URL)
+
+
+class HostRateLimiter:
+    """Per-host token buckets with adaptive backoff
+    
+    Every request reserves a token; callers sleep until their token is due.
+    Throttling responses (HTTP 429, YouTube's "Sign in to confirm") double a
+    per-host penalty during which no tokens are handed out, and successes
+    halve it again. With a state_dir, bucket state lives in lock-protected
+    files so several processes share one budget per host.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST,
+                 max_backoff=RATE_LIMIT_MAX_BACKOFF, state_dir=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self.state_dir = Path(state_dir) if state_dir and fcntl else None
+        if self.state_dir:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._states = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, host):
+        """Wait for a token for host, then report the outcome of the wrapped request"""
+        self.acquire(host)
+        try:
+            yield
+        except Exception as e:
+            if is_throttle_error(e):
+                self.report_throttled(host)
+            raise
+        else:
+            self.report_success(host)
+
+    def acquire(self, host):
+        """Block until a request to host is allowed; return the seconds waited"""
+        delay = self._update(host, self._reserve)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            metrics = self._host_metrics(host)
+            metrics['requests'] += 1
+            if delay > 0:
+                metrics['waited'] += 1
+                metrics['total_wait'] += delay
+                metrics['max_wait'] = max(metrics['max_wait'], delay)
+        return delay
+
+    def report_throttled(self, host):
+        """Back off harder after the host throttled a request"""
+        def penalize(state, now):
+            state['backoff'] = min(self.max_backoff, max(2.0, state['backoff'] * 2))
+            state['penalty_until'] = now + state['backoff']
+        self._update(host, penalize)
+        with self._lock:
+            metrics = self._host_metrics(host)
+            metrics['throttled'] += 1
+
+    def report_success(self, host):
+        """Relax the backoff after a successful request"""
+        def relax(state, now):
+            state['backoff'] = state['backoff'] / 2 if state['backoff'] >= 1 else 0.0
+        self._update(host, relax)
+
+    def _reserve(self, state, now):
+        state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+        state['updated'] = now
+        state['tokens'] -= 1
+        delay = -state['tokens'] / self.rate if state['tokens'] < 0 else 0.0
+        return max(delay, state['penalty_until'] - now)
+
+    def _update(self, host, func):
+        """Apply func(state, now) to the bucket for host under the appropriate lock"""
+        now = time.time()
+        if not self.state_dir:
+            with self._lock:
+                state = self._states.setdefault(host, self._new_state(now))
+                return func(state, now)
+
+        path = self.state_dir / f"{re.sub(r'[^A-Za-z0-9.-]', '_', host)}.json"
+        with open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else self._new_state(now)
+                result = func(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _host_metrics(self, host):
+        return self._metrics.setdefault(
+            host, {'requests': 0, 'waited': 0, 'throttled': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+        )
+
+    def _new_state(self, now):
+        return {'tokens': self.burst, 'updated': now, 'penalty_until': 0.0, 'backoff': 0.0}
+
+    def stats(self):
+        """Return per-host request, wait-time and throttling metrics"""
+        with self._lock:
+            return {host: dict(metrics) for host, metrics in self._metrics.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter():
+    """Process-wide (optionally cross-process) per-host rate limiter"""
+    return HostRateLimiter(state_dir=CACHE_DIR / 'rate_limits' if RATE_LIMIT_SHARED else None)
+
+
+class ConnectionLease:
+    """Connections granted to one download, plus a hook that measures its throughput"""
+
+    def __init__(self, host, connections):
+        self.host = host
+        self.connections = connections
+        self.bytes = 0
+        self.seconds = 0.0
+        self._file_bytes = 0
+        self._started = None
+
+    def progress_hook(self, d):
+        now = time.time()
+        if self._started is None:
+            self._started = now
+        if d['status'] == 'downloading':
+            self._file_bytes = d.get('downloaded_bytes') or 0
+        elif d['status'] == 'finished':
+            self.bytes += d.get('total_bytes') or d.get('downloaded_bytes') or self._file_bytes
+            self._file_bytes = 0
+        self.seconds = now - self._started
+
+    @property
+    def throughput(self):
+        total = self.bytes + self._file_bytes
+        return total / self.seconds if self.seconds > 0 else 0.0
+
+
+class ConnectionTuner:
+    """Per-host parallelism tuning under a global connection budget
+    
+    Each host starts at start_connections. After every measured download
+    the tuner doubles the connection count for that host while doubling
+    still raises throughput by at least min_gain, and settles back on the
+    previous count once gains flatten. All active
+    downloads together never hold more than budget connections beyond the
+    single connection every download is always allowed.
+    """
+
+    MIN_SAMPLE_BYTES = 1024 * 1024
+    REPROBE_AFTER = 20
+
+    def __init__(self, start_connections=ACCEL_START_CONNECTIONS, max_connections=ACCEL_MAX_CONNECTIONS,
+                 budget=ACCEL_CONNECTION_BUDGET, min_gain=ACCEL_MIN_GAIN, enabled=ACCELERATION):
+        self.start_connections = start_connections
+        self.max_connections = max_connections
+        self.budget = budget
+        self.min_gain = min_gain
+        self.enabled = enabled
+        self.in_use = 0
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, host):
+        """Reserve connections for one download of host and learn from its throughput"""
+        with self._lock:
+            state = self._state(host)
+            wanted = state['connections'] if self.enabled else 1
+            granted = max(1, min(wanted, self.budget - self.in_use))
+            self.in_use += granted
+        lease = ConnectionLease(host, granted)
+        try:
+            yield lease
+        finally:
+            with self._lock:
+                self.in_use -= granted
+                if self.enabled and lease.bytes >= self.MIN_SAMPLE_BYTES:
+                    self._learn(self._state(host), granted, lease.throughput)
+
+    def _state(self, host):
+        return self._hosts.setdefault(host, {
+            'connections': self.start_connections,
+            'samples': {},
+            'settled': False,
+            'since_settled': 0,
+        })
+
+    def _learn(self, state, connections, throughput):
+        samples = state['samples']
+        previous = samples.get(connections)
+        samples[connections] = throughput if previous is None else 0.5 * previous + 0.5 * throughput
+        if connections != state['connections']:
+            # Budget-limited run: useful as a sample, but not a tuning step
+            return
+
+        if state['settled']:
+            state['since_settled'] += 1
+            if state['since_settled'] >= self.REPROBE_AFTER:
+                state['settled'] = False
+                state['since_settled'] = 0
+            return
+
+        lower = samples.get(connections // 2)
+        if lower is not None and samples[connections] < lower * (1 + self.min_gain):
+            # Gains flattened: the extra connections are not worth their share of the budget
+            state['connections'] = connections // 2
+            state['settled'] = True
+        elif connections * 2 <= self.max_connections:
+            state['connections'] = connections * 2
+        else:
+            state['settled'] = True
+
+    def stats(self):
+        """Current connection count and measured throughput per host"""
+        with self._lock:
+            return {
+                host: {
+                    'connections': state['connections'],
+                    'settled': state['settled'],
+                    'throughput': dict(state['samples']),
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def get_connection_tuner():
+    """Process-wide connection tuner shared by every download"""
+    return ConnectionTuner()
+
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_POSTPROCESSING = 'postprocessing'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+@functools.lru_cache(maxsize=None)
+def is_ffmpeg_postprocessor(name):
+    """Whether the postprocessor yt-dlp reports as name ('ExtractAudio', 'Merger', ...) runs ffmpeg"""
+    # Hooks report pp_key(), which drops the 'FFmpeg' prefix of the class name
+    postprocessors = yt_dlp.postprocessor
+    cls = getattr(postprocessors, f'FFmpeg{name}PP', None) or getattr(postprocessors, f'{name}PP', None)
+    return cls is not None and issubclass(cls, postprocessors.FFmpegPostProcessor)
+
+
+class DownloadJob:
+    """State of a background download job"""
+
+    def __init__(self, job_id, description, postprocess_slots):
+        self.id = job_id
+        self.description = description
+        self.state = JOB_QUEUED
+        self.result = None
+        self.error = None
+        # Per-item results for batch jobs
+        self.details = None
+        # Conversion plan chosen by plan_conversion
+        self.conversion = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Live transfer progress published by progress_hook
+        self.progress = {
+            'downloaded_bytes': 0,
+            'total_bytes': None,
+            'fraction': 0.0,
+            'speed': None,
+            'average_speed': None,
+            'eta': None,
+            'fragment_index': None,
+            'fragment_count': None,
+            'postprocessor': None,
+            'status_text': None,
+        }
+        # Wall-clock seconds spent in each phase: extract, transfer, merge, convert
+        self.phases = {}
+        self.postprocessor_times = {}
+        self._finished_bytes = 0
+        self._transfer_started = None
+        self._postprocessor_started = None
+        self._postprocess_slots = postprocess_slots
+        self._holds_postprocess_slot = False
+
+    @property
+    def active(self):
+        return self.state not in (JOB_DONE, JOB_FAILED)
+
+    def progress_hook(self, d):
+        """yt-dlp progress hook that records bytes, speed, ETA and fragments"""
+        now = time.time()
+        if self._transfer_started is None:
+            self._transfer_started = now
+            self.phases['extract'] = now - (self.started_at or now)
+
+        if d['status'] == 'downloading':
+            downloaded = d.get('downloaded_bytes') or 0
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            self.progress.update({
+                'downloaded_bytes': self._finished_bytes + downloaded,
+                'total_bytes': self._finished_bytes + total if total else None,
+                'fraction': min(downloaded / total, 1.0) if total else 0.0,
+                'speed': d.get('speed'),
+                'eta': d.get('eta'),
+                'fragment_index': d.get('fragment_index'),
+                'fragment_count': d.get('fragment_count'),
+            })
+        elif d['status'] == 'finished':
+            self._finished_bytes += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            self.progress.update({
+                'downloaded_bytes': self._finished_bytes,
+                'fraction': 1.0,
+                'speed': None,
+                'eta': 0,
+            })
+
+        elapsed = now - self._transfer_started
+        self.phases['transfer'] = elapsed
+        if elapsed > 0:
+            self.progress['average_speed'] = self.progress['downloaded_bytes'] / elapsed
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor hook that times each postprocessor and limits concurrent ffmpeg runs"""
+        name = d.get('postprocessor') or 'Unknown'
+        if d['status'] == 'started':
+            self.state = JOB_POSTPROCESSING
+            self.progress['postprocessor'] = name
+            self._postprocessor_started = time.time()
+            if is_ffmpeg_postprocessor(name) and not self._holds_postprocess_slot:
+                self._postprocess_slots.acquire()
+                self._holds_postprocess_slot = True
+        elif d['status'] == 'finished' and self._postprocessor_started:
+            elapsed = time.time() - self._postprocessor_started
+            self._postprocessor_started = None
+            self.postprocessor_times[name] = self.postprocessor_times.get(name, 0) + elapsed
+            if 'Merger' in name:
+                self.phases['merge'] = self.phases.get('merge', 0) + elapsed
+            elif is_ffmpeg_postprocessor(name):
+                self.phases['convert'] = self.phases.get('convert', 0) + elapsed
+
+    def release_postprocess_slot(self):
+        if self._holds_postprocess_slot:
+            self._holds_postprocess_slot = False
+            self._postprocess_slots.release()
+
+
+class JobManager:
+    """Bounded worker pool that runs downloads outside the Streamlit script thread
+    
+    Transfers run on a thread pool. Postprocessing already happens in ffmpeg
+    subprocesses, so it is only throttled by a semaphore that caps how many
+    jobs may run ffmpeg at once.
+    """
+
+    def __init__(self, workers=DOWNLOAD_WORKERS, postprocess_workers=POSTPROCESS_WORKERS,
+                 retention=JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download')
+        # Batch jobs mostly wait on their items (bounded by BatchLimits); keep them off the download workers
+        self._batch_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-job')
+        self._postprocess_slots = threading.BoundedSemaphore(postprocess_workers)
+        self._jobs = {}
+        self._phase_totals = {}
+        self._phase_counts = {}
+        self._lock = threading.Lock()
+
+    def submit(self, description, func, *args, batch=False):
+        """Queue func(job, *args) and return the new job ID; batch jobs get their own pool"""
+        job = DownloadJob(uuid.uuid4().hex[:12], description, self._postprocess_slots)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        (self._batch_executor if batch else self._executor).submit(self._run, job, func, args)
+        return job.id
+
+    def get(self, job_id):
+        """Return the job with job_id, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, func, args):
+        job.state = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(job, *args)
+            if job.result:
+                state = JOB_DONE
+            else:
+                job.error = "No file was produced"
+                state = JOB_FAILED
+        except Exception as e:
+            job.error = str(e)
+            state = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            job.release_postprocess_slot()
+            with self._lock:
+                for phase, seconds in job.phases.items():
+                    self._phase_totals[phase] = self._phase_totals.get(phase, 0) + seconds
+                    self._phase_counts[phase] = self._phase_counts.get(phase, 0) + 1
+        # Only now is the job inactive: _prune relies on finished_at being set by then
+        job.state = state
+
+    def phase_summary(self):
+        """Aggregate phase timings of finished jobs: {phase: {'count', 'total', 'mean'}}"""
+        with self._lock:
+            return {
+                phase: {
+                    'count': self._phase_counts[phase],
+                    'total': total,
+                    'mean': total / self._phase_counts[phase],
+                }
+                for phase, total in self._phase_totals.items()
+            }
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if not job.active and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+@functools.lru_cache(maxsize=None)
+def get_job_manager():
+    """Process-wide background job manager"""
+    return JobManager()
+
+
+def downloaded_filepath(info):
+    """Final path of a finished download, as reported by yt-dlp after postprocessing"""
+    if not info:
+        return None
+    for download in reversed(info.get('requested_downloads') or []):
+        if download.get('filepath'):
+            return download['filepath']
+    return info.get('filepath')
+
+
+def process_alive(pid):
+    """Best-effort check whether another process with pid is still running"""
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobJournal:
+    """SQLite journal of in-flight downloads, so they can resume after a restart
+    
+    Every download works in a stable directory under work_root named after
+    its artifact key. While it runs, the journal keeps what is needed to
+    start it again (URL, options, chosen format IDs, clip). After a restart,
+    entries left by a dead process are claimed and re-run in the same
+    directory, where yt-dlp's continuedl picks up the .part files.
+    """
+
+    def __init__(self, db_path, work_root, partial_ttl=PARTIAL_TTL, budget_bytes=WORK_BUDGET_MB * 1024 * 1024):
+        self.work_root = Path(work_root)
+        self.work_root.mkdir(parents=True, exist_ok=True)
+        self.partial_ttl = partial_ttl
+        self.budget_bytes = budget_bytes
+        # Distinguishes this process from an earlier one that had the same PID
+        self.owner = uuid.uuid4().hex
+        self._in_use = {}
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def work_dir(self, key):
+        """Stable working directory for key, where partial files survive restarts"""
+        path = self.work_root / key
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    @contextmanager
+    def in_use(self, key):
+        """Protect the working directory of key from the janitor while a request uses it"""
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield self.work_dir(key)
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+
+    def record(self, key, entry):
+        """Journal a download that is about to start"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (key, payload, owner, pid, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(entry), self.owner, os.getpid(), time.time())
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the journaled entry for key, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM jobs WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def finish(self, key):
+        """Forget a download that completed or failed in this process"""
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE key = ? AND owner = ?", (key, self.owner))
+            self._db.commit()
+
+    def clear_partials(self, key):
+        """Remove the working directory of key once its result is stored elsewhere"""
+        shutil.rmtree(self.work_root / key, ignore_errors=True)
+
+    def claim_interrupted(self):
+        """Take over entries left by processes that are no longer running"""
+        claimed = []
+        with self._lock:
+            rows = self._db.execute("SELECT key, payload, owner, pid FROM jobs").fetchall()
+            for key, payload, owner, pid in rows:
+                if owner == self.owner or (pid != os.getpid() and process_alive(pid)):
+                    continue
+                self._db.execute(
+                    "UPDATE jobs SET owner = ?, pid = ?, updated_at = ? WHERE key = ?",
+                    (self.owner, os.getpid(), time.time(), key)
+                )
+                claimed.append(json.loads(payload))
+            self._db.commit()
+        return claimed
+
+    def sweep(self):
+        """Janitor: delete abandoned working directories by age, then oldest first over the budget
+        
+        Directories of journaled or in-use downloads are never removed, but
+        they count towards the budget. Returns the number removed.
+        """
+        cutoff = time.time() - self.partial_ttl
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE updated_at < ? AND owner != ?", (cutoff, self.owner))
+            self._db.commit()
+            protected = {row[0] for row in self._db.execute("SELECT key FROM jobs")} | set(self._in_use)
+
+        removed = 0
+        total = 0
+        candidates = []
+        for work_dir in self.work_root.iterdir():
+            if not work_dir.is_dir():
+                continue
+            try:
+                mtime = work_dir.stat().st_mtime
+                size = sum(path.stat().st_size for path in work_dir.rglob('*') if path.is_file())
+            except FileNotFoundError:
+                # Finished and cleared by another thread meanwhile
+                continue
+            if work_dir.name in protected:
+                total += size
+            elif mtime < cutoff:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                removed += 1
+            else:
+                candidates.append((mtime, size, work_dir))
+                total += size
+
+        for _, size, work_dir in sorted(candidates):
+            if total <= self.budget_bytes:
+                break
+            shutil.rmtree(work_dir, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """Return the number of journaled downloads and working directories"""
+        with self._lock:
+            journaled = self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return {'journaled': journaled, 'work_dirs': sum(1 for path in self.work_root.iterdir() if path.is_dir())}
+
+
+@functools.lru_cache(maxsize=None)
+def get_job_journal():
+    """Process-wide journal of in-flight downloads"""
+    return JobJournal(CACHE_DIR / 'jobs.sqlite3', CACHE_DIR / 'work')
+
+
+class StrategyRegistry:
+    """Per-platform success and latency statistics of the extraction strategies
+    
+    Counts decay with a half-life, so the ranking follows platforms as they
+    change their bot detection, and are persisted in SQLite. order() ranks
+    strategies by expected time to a successful extraction and leaves out
+    those that failed drop_after times in a row until retry_after seconds
+    have passed since their last attempt.
+    """
+
+    latency_alpha = 0.3
+    # A leading strategy this reliable is tried alone before the others
+    reliable_rate = 0.9
+    reliable_samples = 3
+
+    def __init__(self, db_path, half_life=STRATEGY_HALF_LIFE, drop_after=STRATEGY_DROP_AFTER,
+                 retry_after=STRATEGY_RETRY_AFTER):
+        self.half_life = half_life
+        self.drop_after = drop_after
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS strategy_stats (
+                platform TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                successes REAL NOT NULL,
+                failures REAL NOT NULL,
+                latency REAL,
+                streak INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (platform, strategy)
+            )
+        """)
+        self._db.commit()
+        self._stats = {
+            (platform, strategy): {
+                'successes': successes, 'failures': failures, 'latency': latency,
+                'streak': streak, 'updated_at': updated_at,
+            }
+            for platform, strategy, successes, failures, latency, streak, updated_at
+            in self._db.execute("SELECT * FROM strategy_stats")
+        }
+
+    def _decayed(self, entry, now):
+        """(successes, failures) of entry decayed to now"""
+        factor = 0.5 ** (max(0.0, now - entry['updated_at']) / self.half_life)
+        return entry['successes'] * factor, entry['failures'] * factor
+
+    def _success_rate(self, entry, now):
+        successes, failures = self._decayed(entry, now)
+        # One imaginary success and failure keep new strategies from scoring 0 or 1
+        return (successes + 1) / (successes + failures + 2)
+
+    def _dropped(self, entry, now):
+        return entry['streak'] >= self.drop_after and now - entry['updated_at'] < self.retry_after
+
+    def record(self, platform, strategy, success, latency=None):
+        """Add the outcome of one extraction attempt"""
+        now = time.time()
+        with self._lock:
+            entry = self._stats.get((platform, strategy))
+            if entry is None:
+                entry = {'successes': 0.0, 'failures': 0.0, 'latency': None, 'streak': 0, 'updated_at': now}
+            successes, failures = self._decayed(entry, now)
+            average = entry['latency']
+            if success:
+                successes += 1
+                if latency is not None:
+                    average = latency if average is None else average + self.latency_alpha * (latency - average)
+            else:
+                failures += 1
+            entry = {
+                'successes': successes, 'failures': failures, 'latency': average,
+                'streak': 0 if success else entry['streak'] + 1, 'updated_at': now,
+            }
+            self._stats[(platform, strategy)] = entry
+            self._db.execute(
+                "INSERT OR REPLACE INTO strategy_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (platform, strategy, successes, failures, average, entry['streak'], now),
+            )
+            self._db.commit()
+
+    def order(self, platform, strategies):
+        """Rank strategies for platform; returns (ordered names, whether the first is reliable)"""
+        now = time.time()
+        with self._lock:
+            entries = {name: self._stats.get((platform, name)) for name in strategies}
+            latencies = [entry['latency'] for entry in entries.values() if entry and entry['latency']]
+            # Untried strategies are assumed to be as fast as the average and to work half the time
+            default_latency = sum(latencies) / len(latencies) if latencies else 0.0
+
+            ranked = []
+            for index, name in enumerate(strategies):
+                entry = entries[name]
+                if entry is None:
+                    ranked.append((default_latency * 2, index, name))
+                elif not self._dropped(entry, now):
+                    latency = entry['latency'] if entry['latency'] is not None else default_latency
+                    ranked.append((latency / self._success_rate(entry, now), index, name))
+            ordered = [name for _, _, name in sorted(ranked)]
+            if not ordered:
+                # Every strategy keeps failing; keep trying all of them rather than none
+                return list(strategies), False
+
+            best = entries[ordered[0]]
+            reliable = bool(best) and (
+                sum(self._decayed(best, now)) >= self.reliable_samples
+                and self._success_rate(best, now) >= self.reliable_rate
+            )
+            return ordered, reliable
+
+    def export(self):
+        """Return every (platform, strategy) row with its decayed stats"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for (platform, strategy), entry in sorted(self._stats.items()):
+                successes, failures = self._decayed(entry, now)
+                rows.append({
+                    'platform': platform,
+                    'strategy': strategy,
+                    'successes': round(successes, 3),
+                    'failures': round(failures, 3),
+                    'success_rate': round(self._success_rate(entry, now), 3),
+                    'latency': round(entry['latency'], 3) if entry['latency'] is not None else None,
+                    'failure_streak': entry['streak'],
+                    'dropped': self._dropped(entry, now),
+                    'last_attempt': entry['updated_at'],
+                })
+            return rows
+
+
+@functools.lru_cache(maxsize=None)
+def get_strategy_registry():
+    """Process-wide strategy statistics shared by every session"""
+    return StrategyRegistry(CACHE_DIR / 'strategies.sqlite3')
+
+
+class MediaDownloader:
+    def __init__(self):
+        self.metadata_cache = get_metadata_cache()
+        self.artifact_store = get_artifact_store()
+        self.job_manager = get_job_manager()
+        self.job_journal = get_job_journal()
+        self.rate_limiter = get_rate_limiter()
+        self.connection_tuner = get_connection_tuner()
+        self.extractor_router = get_extractor_router()
+        self.strategy_registry = get_strategy_registry()
+        self.thumbnail_cache = get_thumbnail_cache()
+        self.stats = {
+            'extractions': 0,
+            'info_reuses': 0,
+            'conversions': {'copy': 0, 'remux': 0, 'transcode': 0},
+        }
+        self.supported_sites = [
+            'YouTube', 'Vimeo', 'Facebook', 'Instagram', 'Twitter', 'TikTok',
+            'Dailymotion', 'Twitch', 'Reddit', 'SoundCloud', 'Bandcamp'
+        ]
+        self.user_agents = [
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+        ]
+        
+    def is_youtube_url(self, url):
+        """Check if URL is from YouTube"""
+        return bool(YOUTUBE_URL_PATTERN.search(url))
+    
+    def get_youtube_opts(self, method="web"):
+        """Get YouTube-specific options"""
+        base_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extractflat': False,
+            'retries': 3,
+            'fragment_retries': 3,
+            'skip_unavailable_fragments': True,
+            'ignoreerrors': False,
+            'socket_timeout': 30,
+        }
+        
+        if method == "mobile":
+            base_opts['http_headers'] = {
+                'User-Agent': 'com.google.android.youtube/19.09.37 (Linux; U; Android 11) gzip',
+                'X-YouTube-Client-Name': '3',
+                'X-YouTube-Client-Version': '19.09.37',
+            }
+            base_opts['extractor_args'] = {
+                'youtube': {
+                    'player_client': ['android'],
+                    'player_skip': ['webpage'],
+                }
+            }
+        else:  # web method
+            base_opts['http_headers'] = {
+                'User-Agent': random.choice(self.user_agents),
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+            }
+            base_opts['extractor_args'] = {
+                'youtube': {
+                    'player_client': ['web', 'android'],
+                    'player_skip': ['configs'],
+                }
+            }
+        
+        return base_opts
+    
+    def get_standard_opts(self):
+        """Get options for non-YouTube platforms"""
+        return {
+            'quiet': True,
+            'no_warnings': True,
+            'extractflat': False,
+            'http_headers': {
+                'User-Agent': random.choice(self.user_agents),
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.9',
+            },
+            'retries': 3,
+            'fragment_retries': 3,
+            'skip_unavailable_fragments': True,
+            'ignoreerrors': False,
+        }
+    
+    def get_plain_opts(self):
+        """Get options that keep yt-dlp's own request headers"""
+        return {
+            'quiet': True,
+            'no_warnings': True,
+            'extractflat': False,
+            'retries': 3,
+            'fragment_retries': 3,
+            'skip_unavailable_fragments': True,
+            'ignoreerrors': False,
+        }
+    
+    def get_opts_for_method(self, method):
+        """Rebuild the options for a previously successful method"""
+        if method == "standard":
+            return self.get_standard_opts()
+        if method == "plain":
+            return self.get_plain_opts()
+        return self.get_youtube_opts(method)
+    
+    def strategy_order(self, url):
+        """Return (method names best first, whether the first is reliable enough to try alone)"""
+        if self.is_youtube_url(url):
+            strategies = ["web", "mobile"]
+        else:
+            strategies = ["standard", "plain"]
+        return self.strategy_registry.order(media_host(url), strategies)
+    
+    def get_video_info(self, url):
+        """Analyze url, using the metadata cache when possible, and return an AnalysisResult
+        
+        Raises AnalysisError when every extraction method failed.
+        """
+        method_name, opts, info, errors = self.analyze(url)
+        if not info:
+            raise AnalysisError(url, errors)
+        return AnalysisResult(method_name, opts, self.format_video_info(info, url, method_name))
+    
+    def analyze(self, url):
+        """Extract (or load cached) compact info without touching the UI
+        
+        Returns (method_name, opts, info, errors); info is None when every
+        method failed.
+        """
+        media_id = canonical_media_id(url)
+        cached = self.metadata_cache.get(media_id)
+        if cached:
+            return cached['method'], self.get_opts_for_method(cached['method']), cached['info'], {}
+        
+        # Best strategy for this platform first; race them unless it has a reliable record
+        method_names, reliable = self.strategy_order(url)
+        methods = [(method_name, self.get_opts_for_method(method_name)) for method_name in method_names]
+        concurrency = 1 if reliable else STRATEGY_CONCURRENCY
+        
+        method_name, opts, info, errors = self.run_strategies(url, methods, concurrency)
+        if info:
+            info = self.cache_info(media_id, method_name, info)
+        return method_name, opts, info, errors
+    
+    def extract_with_opts(self, url, opts):
+        """Run a single extraction attempt"""
+        self.stats['extractions'] += 1
+        route = self.extractor_router.route(url)
+        with self.rate_limiter.limit(media_host(url)):
+            if route:
+                try:
+                    with yt_dlp.YoutubeDL(self.routed_opts(opts, route)) as ydl:
+                        return ydl.extract_info(url, download=False, ie_key=route.ie_key)
+                except yt_dlp.utils.DownloadError as e:
+                    if not is_unroutable_error(e):
+                        raise
+            # YoutubeDL adds its own keys to the params it is given; keep opts reusable and JSON-safe
+            with yt_dlp.YoutubeDL(dict(opts)) as ydl:
+                return ydl.extract_info(url, download=False)
+    
+    def routed_opts(self, opts, route):
+        """Copy of opts that only loads the extractor family of route"""
+        return dict(opts, allowed_extractors=route.allowed_extractors)
+    
+    def run_strategies(self, url, methods, concurrency=STRATEGY_CONCURRENCY):
+        """Run extraction methods concurrently and return the first success
+        
+        Returns (method_name, opts, info, errors). Slower attempts that are
+        already running are left to finish in the background; their outcome
+        still goes into the strategy statistics.
+        """
+        errors = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(methods))))
+        futures = {
+            executor.submit(self.timed_extraction, url, method_name, opts): (method_name, opts)
+            for method_name, opts in methods
+        }
+        try:
+            for future in as_completed(futures):
+                method_name, opts = futures[future]
+                try:
+                    info = future.result()
+                except Exception as e:
+                    errors[method_name] = e
+                    continue
+                if info:
+                    return method_name, opts, info, errors
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return None, None, None, errors
+    
+    def timed_extraction(self, url, method_name, opts):
+        """Run extract_with_opts and record its outcome for the strategy ranking"""
+        started = time.monotonic()
+        try:
+            info = self.extract_with_opts(url, opts)
+        except Exception:
+            self.strategy_registry.record(media_host(url), method_name, False)
+            raise
+        self.strategy_registry.record(media_host(url), method_name, bool(info), time.monotonic() - started)
+        return info
+    
+    def cache_info(self, media_id, method, info):
+        """Compact an extracted info dict and store it in the metadata cache"""
+        info = self.compact_info(info)
+        self.metadata_cache.set(media_id, {'method': method, 'info': info})
+        return info
+    
+    def compact_info(self, info):
+        """Strip an info dict down to what format selection and download need"""
+        info = yt_dlp.YoutubeDL.sanitize_info(info)
+        # The full-size thumbnail is often the largest one; keep one close to display size
+        info['thumbnail'] = pick_thumbnail(info)
+        for key in HEAVY_INFO_KEYS:
+            info.pop(key, None)
+        return info
+    
+    def get_cached_info(self, url):
+        """Return the compacted info dict from a previous analysis, if still cached"""
+        cached = self.metadata_cache.get(canonical_media_id(url))
+        return cached['info'] if cached else None
+    
+    def format_video_info(self, info, url, method=None):
+        """Format video information for display as a compact VideoInfo"""
+        # Get thumbnail
+        thumbnail = pick_thumbnail(info)
+        
+        # Handle view count for different platforms
+        view_count = info.get('view_count') or info.get('like_count') or info.get('repost_count') or 0
+        duration = info.get('duration') or 0
+        
+        return VideoInfo(
+            media_id=canonical_media_id(url),
+            title=info.get('title') or 'Unknown Title',
+            duration=duration,
+            uploader=info.get('uploader') or 'Unknown',
+            view_count=view_count,
+            upload_date=info.get('upload_date') or '',
+            thumbnail=thumbnail,
+            platform='YouTube' if self.is_youtube_url(url) else info.get('extractor_key', 'Unknown'),
+            method=method,
+            formats=format_records(info.get('formats') or [], duration),
+        )
+    
+    def download_media(self, url, format_type, quality, output_format, working_opts, clip=None):
+        """Download media synchronously, reusing stored artifacts, and return a DownloadResult
+        
+        Raises DownloadFailedError when no file was produced; yt-dlp errors propagate.
+        """
+        path = self.produce_artifact(None, url, format_type, quality, output_format, working_opts, clip)
+        if not path:
+            raise DownloadFailedError(f"No file was produced for {url}")
+        return DownloadResult(url, path, os.path.getsize(path))
+    
+    def start_download(self, url, format_type, quality, output_format, working_opts, clip=None):
+        """Queue a background download and return its job ID"""
+        description = f"{format_type} · {quality} · {output_format}"
+        if clip:
+            description += f" · clip {clip.label}"
+        return self.job_manager.submit(
+            description,
+            self.produce_artifact,
+            url, format_type, quality, output_format, working_opts, clip
+        )
+    
+    def start_batch(self, urls, format_type, quality, output_format):
+        """Queue a background batch download and return its job ID"""
+        return self.job_manager.submit(
+            f"Batch of {len(urls)} URLs · {format_type} · {quality} · {output_format}",
+            self.run_batch,
+            urls, format_type, quality, output_format,
+            batch=True
+        )
+    
+    def run_batch(self, job, urls, format_type, quality, output_format):
+        """Download every URL of a batch and bundle the results into a ZIP"""
+        def update_progress(done, total):
+            job.progress['fraction'] = done / total if total else 0.0
+            job.progress['status_text'] = f"{done}/{total} items finished"
+        
+        scheduler = BatchScheduler(
+            self, format_type, quality, output_format, progress_callback=update_progress
+        )
+        job.details = scheduler.results
+        scheduler.run(urls)
+        if not any(result['file'] for result in scheduler.results):
+            raise Exception("Every item in the batch failed")
+        
+        job.state = JOB_POSTPROCESSING
+        job.progress['postprocessor'] = "ZIP archive"
+        # The archive is stored like any other artifact, so the work-dir janitor never evicts it
+        key = self.artifact_store.make_key('batch', job.id)
+        with self.job_journal.in_use(key) as work_dir:
+            archive_path = scheduler.write_archive(str(work_dir / f"batch-{job.id}.zip"))
+            path = self.artifact_store.add(key, archive_path)
+        self.job_journal.clear_partials(key)
+        return path
+    
+    def resume_job(self, entry):
+        """Queue a journaled download again; it continues from its partial files"""
+        clip = ClipRange(*entry['clip']) if entry['clip'] else None
+        return self.job_manager.submit(
+            f"Resumed · {entry['description'].removeprefix('Resumed · ')}",
+            self.produce_artifact,
+            entry['url'], entry['format_type'], entry['quality'], entry['output_format'], entry['opts'], clip
+        )
+    
+    def artifact_key(self, url, format_type, quality, output_format, clip=None):
+        """Key of the artifact (and working directory) for a download request"""
+        return self.artifact_store.make_key(
+            canonical_media_id(url), format_type, quality, output_format, *(clip or ())
+        )
+    
+    def produce_artifact(self, job, url, format_type, quality, output_format, working_opts, clip=None):
+        """Return the stored artifact for a request, downloading it if needed"""
+        key = self.artifact_key(url, format_type, quality, output_format, clip)
+        try:
+            with self.job_journal.in_use(key):
+                def produce():
+                    planned = self.plan_download(url, format_type, quality, output_format, clip)
+                    path = self.fetch_media(url, format_type, quality, output_format, working_opts, job, clip, planned)
+                    # yt-dlp's fallback selection may not be what the request asked for:
+                    # keep it under its own format so it is never served for this key
+                    plan = planned[1]
+                    return path, key if plan['exact'] else self.artifact_store.make_key(key, plan['format'])
+                path = self.artifact_store.get_or_create(key, produce)
+                # The result now lives in the artifact store; failed downloads keep their partials for a retry
+                self.job_journal.clear_partials(key)
+            return path
+        finally:
+            self.job_journal.sweep()
+    
+    def plan_download(self, url, format_type, quality, output_format, clip=None):
+        """Return (info, plan) for a request, analyzing url again if its info left the cache"""
+        info = self.get_cached_info(url)
+        if info is None:
+            # run_download would extract anyway; doing it first keeps the exact-format plan
+            info = self.analyze(url)[2]
+        info = info or {}
+        index = FormatIndex.from_formats(info.get('formats') or [], info.get('duration'))
+        return info, plan_conversion(index, format_type, quality, output_format, clip)
+    
+    def fetch_media(self, url, format_type, quality, output_format, working_opts, job=None, clip=None,
+                    planned=None):
+        """Download and post-process media into the request's own working directory
+        
+        planned is the (info, plan) pair from plan_download, made here when
+        omitted. Returns the final file path reported by yt-dlp, or None if
+        nothing was produced.
+        """
+        key = self.artifact_key(url, format_type, quality, output_format, clip)
+        work_dir = self.job_journal.work_dir(key)
+        interrupted = self.job_journal.get(key)
+        opts = working_opts.copy()
+        opts['outtmpl'] = f"{work_dir}/%(title)s.%(ext)s"
+        if clip:
+            # Only the fragments or byte ranges covering the clip are transferred
+            opts['outtmpl'] = f"{work_dir}/%(title)s [{clip.file_label}].%(ext)s"
+            opts['download_ranges'] = clip.download_ranges()
+            opts['force_keyframes_at_cuts'] = clip.precise
+        # Progress is reported through hooks; keep stdout clean for callers such as the CLI
+        opts['noprogress'] = True
+        if job:
+            opts['progress_hooks'] = [job.progress_hook]
+            opts['postprocessor_hooks'] = [job.postprocessor_hook]
+        
+        # Prefer sources that only need a stream copy over re-encoding
+        info, plan = planned or self.plan_download(url, format_type, quality, output_format, clip)
+        if interrupted:
+            # Stick to the formats whose partial files are already on disk
+            plan['format'] = interrupted['format']
+        opts['format'] = plan['format']
+        if plan['postprocessors']:
+            opts['postprocessors'] = plan['postprocessors']
+        if plan.get('merge_output_format'):
+            opts['merge_output_format'] = plan['merge_output_format']
+        self.stats['conversions'][plan['path']] += 1
+        if job:
+            job.conversion = plan
+        
+        self.job_journal.record(key, {
+            'url': url,
+            'format_type': format_type,
+            'quality': quality,
+            'output_format': output_format,
+            'clip': list(clip) if clip else None,
+            'format': plan['format'],
+            'opts': working_opts,
+            'work_dir': str(work_dir),
+            'description': job.description if job else f"{format_type} · {quality} · {output_format}",
+        })
+        try:
+            with self.connection_tuner.lease(media_host(url)) as lease:
+                self.apply_acceleration(opts, lease)
+                path = self.run_download(url, opts, info)
+        finally:
+            # Only a process that dies mid-download leaves its entry behind
+            self.job_journal.finish(key)
+        
+        return path if path and os.path.isfile(path) else None
+    
+    def apply_acceleration(self, opts, lease):
+        """Add concurrent fragment and chunked range download options for a lease"""
+        opts['progress_hooks'] = opts.get('progress_hooks', []) + [lease.progress_hook]
+        if not self.connection_tuner.enabled:
+            return
+        opts['concurrent_fragment_downloads'] = lease.connections
+        opts['http_chunk_size'] = ACCEL_HTTP_CHUNK_MB * 1024 * 1024
+        if ACCEL_ARIA2C and lease.connections > 1 and shutil.which('aria2c'):
+            opts['external_downloader'] = {'http': 'aria2c'}
+            opts['external_downloader_args'] = {'aria2c': [
+                '-x', str(lease.connections), '-s', str(lease.connections), '-k', '1M',
+            ]}
+    
+    def run_download(self, url, opts, info):
+        """Download url, reusing the analyzed info dict when it is available
+        
+        Returns the final path of the downloaded file after postprocessing.
+        """
+        route = self.extractor_router.route(url)
+        with self.rate_limiter.limit(media_host(url)):
+            with yt_dlp.YoutubeDL(self.routed_opts(opts, route) if route else opts) as ydl:
+                if info:
+                    try:
+                        # Reuse the analyzed info dict so only media transfer happens
+                        result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                        self.stats['info_reuses'] += 1
+                        return downloaded_filepath(result)
+                    except yt_dlp.utils.DownloadError as e:
+                        # Only expired stream URLs are fixed by extracting again; other
+                        # failures (ffmpeg, disk, clip cutting) would just repeat
+                        if not is_expired_url_error(e):
+                            raise
+                self.stats['extractions'] += 1
+                try:
+                    return downloaded_filepath(
+                        ydl.extract_info(url, download=True, ie_key=route and route.ie_key)
+                    )
+                except yt_dlp.utils.DownloadError as e:
+                    if not route or not is_unroutable_error(e):
+                        raise
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                return downloaded_filepath(ydl.extract_info(url, download=True))
+    
+    def format_duration(self, seconds):
+        """Format duration in readable format"""
+        if not seconds:
+            return "Unknown"
+        
+        try:
+            seconds = int(seconds)
+            hours = seconds // 3600
+            minutes = (seconds % 3600) // 60
+            secs = seconds % 60
+            
+            if hours > 0:
+                return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+            else:
+                return f"{minutes:02d}:{secs:02d}"
+        except:
+            return "Unknown"
+    
+    def format_filesize(self, size):
+        """Format file size in readable format"""
+        if not size:
+            return "Unknown"
+        
+        try:
+            size = float(size)
+            for unit in ['B', 'KB', 'MB', 'GB']:
+                if size < 1024.0:
+                    return f"{size:.1f} {unit}"
+                size /= 1024.0
+            return f"{size:.1f} TB"
+        except:
+            return "Unknown"
+
+class BatchItem:
+    """A URL waiting in the batch queue"""
+
+    def __init__(self, url, expand=True, title=None):
+        self.url = url
+        # Input URLs are flat-extracted first and may turn into playlist entries
+        self.expand = expand
+        self.title = title
+        self.attempts = 0
+        self.not_before = 0.0
+
+    @property
+    def domain(self):
+        return media_host(self.url)
+
+
+class BatchLimits:
+    """Process-wide slots for batch items: one pool overall and one per domain
+    
+    Shared by every BatchScheduler, so concurrent batches together stay
+    within the global and per-domain limits.
+    """
+
+    def __init__(self, concurrency=BATCH_CONCURRENCY, per_domain=BATCH_PER_DOMAIN):
+        self.per_domain = per_domain
+        self._global = threading.BoundedSemaphore(concurrency)
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, domain):
+        """Take a global and a domain slot without blocking; return whether both were free"""
+        with self._lock:
+            domain_slots = self._domains.setdefault(domain, threading.BoundedSemaphore(self.per_domain))
+        if not domain_slots.acquire(blocking=False):
+            return False
+        if not self._global.acquire(blocking=False):
+            domain_slots.release()
+            return False
+        return True
+
+    def release(self, domain):
+        self._global.release()
+        self._domains[domain].release()
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_limits():
+    """Process-wide batch concurrency limits shared by every batch"""
+    return BatchLimits()
+
+
+class BatchScheduler:
+    """Download many URLs within process-wide global and per-domain concurrency limits
+    
+    Playlists and channels are expanded lazily: input URLs get a flat
+    extraction, and each entry is only fully extracted once it is scheduled.
+    Failed items are retried with exponential backoff.
+    """
+
+    def __init__(self, downloader, format_type, quality, output_format,
+                 concurrency=BATCH_CONCURRENCY, limits=None,
+                 retries=BATCH_RETRIES, backoff=BATCH_BACKOFF, max_items=BATCH_MAX_ITEMS,
+                 progress_callback=None):
+        self.downloader = downloader
+        self.format_type = format_type
+        self.quality = quality
+        self.output_format = output_format
+        self.concurrency = concurrency
+        self.limits = limits or get_batch_limits()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_items = max_items
+        self.progress_callback = progress_callback
+        self.results = []
+        self._total = 0
+
+    def run(self, urls):
+        """Process every URL and return the list of per-item results"""
+        queue = [BatchItem(url) for url in urls]
+        self._total = len(queue)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='batch') as executor:
+            while queue or running:
+                now = time.time()
+                for item in list(queue):
+                    if len(running) >= self.concurrency:
+                        break
+                    if item.not_before > now or not self.limits.try_acquire(item.domain):
+                        continue
+                    queue.remove(item)
+                    item.attempts += 1
+                    running[executor.submit(self.process, item)] = item
+
+                if not running:
+                    # Everything left is backing off or waiting for slots held by other batches
+                    time.sleep(max(0.1, min(item.not_before for item in queue) - now))
+                    continue
+
+                done, _ = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = running.pop(future)
+                    self.limits.release(item.domain)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        if item.attempts <= self.retries:
+                            item.not_before = time.time() + self.backoff * 2 ** (item.attempts - 1) + random.random()
+                            queue.append(item)
+                        else:
+                            self.record(item, 'failed', error=str(e))
+                        continue
+
+                    if isinstance(outcome, list):
+                        # Playlist expansion: schedule the entries instead
+                        room = self.max_items - self._total + 1
+                        queue.extend(outcome[:max(0, room)])
+                        self._total += min(len(outcome), max(0, room)) - 1
+                        self.report()
+                    else:
+                        self.record(item, 'done', file=outcome)
+
+        return self.results
+
+    def process(self, item):
+        """Expand a playlist URL into entries, or download a single item"""
+        if item.expand:
+            entries = self.expand(item)
+            if entries is not None:
+                return entries
+
+        method_name, opts, info, errors = self.downloader.analyze(item.url)
+        if not info:
+            raise AnalysisError(item.url, errors)
+        item.title = info.get('title') or item.title
+        path = self.downloader.produce_artifact(
+            None, item.url, self.format_type, self.quality, self.output_format, opts
+        )
+        if not path:
+            raise DownloadFailedError(f"No file was produced for {item.url}")
+        return path
+
+    def expand(self, item):
+        """Flat-extract an input URL; return playlist entries, or None for a single video"""
+        item.expand = False
+        method_name = self.downloader.strategy_order(item.url)[0][0]
+        opts = self.downloader.get_opts_for_method(method_name)
+        opts['extract_flat'] = 'in_playlist'
+        try:
+            info = self.downloader.extract_with_opts(item.url, opts)
+        except Exception:
+            # Let the full extraction (with every strategy) handle single videos
+            return None
+
+        if info and info.get('_type') in ('playlist', 'multi_video'):
+            return [
+                BatchItem(entry.get('url') or entry.get('webpage_url'), expand=False, title=entry.get('title'))
+                for entry in info.get('entries') or []
+                if entry and (entry.get('url') or entry.get('webpage_url'))
+            ]
+        if info:
+            # A single video was fully extracted already, so cache it for the download step
+            self.downloader.cache_info(canonical_media_id(item.url), method_name, info)
+        return None
+
+    def record(self, item, status, file=None, error=None):
+        self.results.append({
+            'url': item.url,
+            'title': item.title,
+            'status': status,
+            'file': file,
+            'error': error,
+            'attempts': item.attempts,
+        })
+        self.report()
+
+    def report(self):
+        if self.progress_callback:
+            self.progress_callback(len(self.results), self._total)
+
+    def write_archive(self, path):
+        """Write a ZIP with every downloaded file and a manifest.json"""
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for index, result in enumerate(self.results, 1):
+                if result['file']:
+                    arcname = f"{index:03d} - {os.path.basename(result['file'])}"
+                    archive.write(result['file'], arcname)
+                    result['archive_name'] = arcname
+            archive.writestr('manifest.json', json.dumps(self.results, indent=2))
+        return path
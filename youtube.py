@@ -1,11 +1,15 @@
 import streamlit as st
-import yt_dlp
+import json
 import os
-import tempfile
-from pathlib import Path
 import time
-import random
-import re
+
+from media_downloader import (
+    AUDIO_FORMATS, AUDIO_QUALITIES, JOB_DONE, JOB_POSTPROCESSING, JOB_QUEUED, JOB_RUNNING, RESUME_JOBS,
+    THUMBNAIL_WAIT, VIDEO_FORMATS, VIDEO_QUALITIES, AnalysisError, ClipRange, MediaDownloader, get_file_server, parse_clip_range, plan_conversion,
+)
+
+# Files up to this size are still handed to st.download_button in memory
+INLINE_DOWNLOAD_LIMIT_MB = int(os.environ.get('MEDIA_DOWNLOADER_INLINE_DOWNLOAD_LIMIT_MB', 50))
 
 # Page configuration
 st.set_page_config(
@@ -87,271 +91,175 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class MediaDownloader:
-    def __init__(self):
-        self.download_dir = tempfile.mkdtemp()
-        self.supported_sites = [
-            'YouTube', 'Vimeo', 'Facebook', 'Instagram', 'Twitter', 'TikTok',
-            'Dailymotion', 'Twitch', 'Reddit', 'SoundCloud', 'Bandcamp'
-        ]
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
-        ]
-        
-    def is_youtube_url(self, url):
-        """Check if URL is from YouTube"""
-        youtube_patterns = [
-            r'youtube\.com/watch',
-            r'youtu\.be/',
-            r'youtube\.com/shorts'
-        ]
-        return any(re.search(pattern, url) for pattern in youtube_patterns)
+@st.cache_resource
+def resume_interrupted_jobs(_downloader):
+    """Sweep abandoned partials and resume downloads a previous process left unfinished
     
-    def get_youtube_opts(self, method="web"):
-        """Get YouTube-specific options"""
-        base_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extractflat': False,
-            'retries': 3,
-            'fragment_retries': 3,
-            'skip_unavailable_fragments': True,
-            'ignoreerrors': False,
-            'socket_timeout': 30,
-        }
-        
-        if method == "mobile":
-            base_opts['http_headers'] = {
-                'User-Agent': 'com.google.android.youtube/19.09.37 (Linux; U; Android 11) gzip',
-                'X-YouTube-Client-Name': '3',
-                'X-YouTube-Client-Version': '19.09.37',
-            }
-            base_opts['extractor_args'] = {
-                'youtube': {
-                    'player_client': ['android'],
-                    'player_skip': ['webpage'],
-                }
-            }
-        else:  # web method
-            base_opts['http_headers'] = {
-                'User-Agent': random.choice(self.user_agents),
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            }
-            base_opts['extractor_args'] = {
-                'youtube': {
-                    'player_client': ['web', 'android'],
-                    'player_skip': ['configs'],
-                }
-            }
-        
-        return base_opts
+    Cached as a resource so it runs once per process, not once per session.
+    Returns the IDs of the resumed jobs.
+    """
+    journal = _downloader.job_journal
+    journal.sweep()
+    if not RESUME_JOBS:
+        return []
+    return [_downloader.resume_job(entry) for entry in journal.claim_interrupted()]
+
+def analyze_video(url):
+    """Analyze url for the UI: report failures with st.error and remember the working options"""
+    downloader = st.session_state.downloader
+    try:
+        result = downloader.get_video_info(url)
+    except AnalysisError as e:
+        if downloader.is_youtube_url(url):
+            for failed_method, error in e.errors.items():
+                if "Sign in to confirm" not in str(error):
+                    st.warning(f"Method {failed_method} failed: {str(error)[:100]}...")
+            st.error("YouTube access blocked by bot detection")
+        else:
+            # Every strategy usually fails the same way: report the best-ranked one only
+            ranked = [name for name in downloader.strategy_order(url)[0] if name in e.errors]
+            error = e.errors[ranked[0]] if ranked else next(iter(e.errors.values()), e)
+            st.error(f"Error analyzing video: {str(error)}")
+        return None
+    except Exception as e:
+        st.error(f"Error analyzing video: {str(e)}")
+        return None
     
-    def get_standard_opts(self):
-        """Get options for non-YouTube platforms"""
-        return {
-            'quiet': True,
-            'no_warnings': True,
-            'extractflat': False,
-            'http_headers': {
-                'User-Agent': random.choice(self.user_agents),
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-            },
-            'retries': 3,
-            'fragment_retries': 3,
-            'skip_unavailable_fragments': True,
-            'ignoreerrors': False,
-        }
+    st.session_state.working_opts = result.opts
+    # Fetch and downscale the thumbnail while the info card renders
+    downloader.thumbnail_cache.prefetch(result.video_info.media_id, result.video_info.thumbnail)
+    return result.video_info
+
+def show_thumbnail(slot, info):
+    """Fill slot with the locally cached thumbnail, waiting briefly for its background fetch"""
+    if not info.thumbnail:
+        slot.info("📷 No thumbnail available")
+        return
+    thumbnail_cache = st.session_state.downloader.thumbnail_cache
+    # Sessions restored from an older analysis may not have fetched it yet
+    thumbnail_cache.prefetch(info.media_id, info.thumbnail)
+    image = thumbnail_cache.get(info.media_id, wait=THUMBNAIL_WAIT)
+    if image:
+        slot.image(image, caption="Thumbnail", use_column_width=True)
+    elif thumbnail_cache.pending(info.media_id):
+        slot.caption("🖼️ Loading thumbnail...")
+    else:
+        slot.warning("⚠️ Thumbnail not available")
+
+def select_download_options(type_column, option_column, key_prefix=""):
+    """Render format type, quality and output format pickers"""
+    with type_column:
+        format_type = st.selectbox(
+            "Format Type",
+            ["Video", "Audio"],
+            help="Choose whether to download video or audio only",
+            key=f"{key_prefix}format_type"
+        )
     
-    def get_video_info(self, url):
-        """Extract video information"""
-        try:
-            if self.is_youtube_url(url):
-                # Try multiple methods for YouTube
-                methods = [("web", self.get_youtube_opts("web")), 
-                          ("mobile", self.get_youtube_opts("mobile"))]
-                
-                for method_name, opts in methods:
-                    try:
-                        with yt_dlp.YoutubeDL(opts) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                            if info:
-                                st.session_state.working_opts = opts
-                                return self.format_video_info(info, url)
-                    except Exception as e:
-                        if "Sign in to confirm" in str(e):
-                            continue
-                        else:
-                            st.warning(f"Method {method_name} failed: {str(e)[:100]}...")
-                            continue
-                
-                st.error("YouTube access blocked by bot detection")
-                return None
-            else:
-                # Non-YouTube platforms
-                opts = self.get_standard_opts()
-                with yt_dlp.YoutubeDL(opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    if info:
-                        st.session_state.working_opts = opts
-                        return self.format_video_info(info, url)
-                
-        except Exception as e:
-            st.error(f"Error analyzing video: {str(e)}")
-            return None
+    with option_column:
+        if format_type == "Video":
+            quality = st.selectbox("Quality", VIDEO_QUALITIES, key=f"{key_prefix}video_quality")
+            output_format = st.selectbox("Output Format", VIDEO_FORMATS, key=f"{key_prefix}video_format")
+        else:
+            quality = st.selectbox("Quality (kbps)", AUDIO_QUALITIES, key=f"{key_prefix}audio_quality")
+            output_format = st.selectbox("Output Format", AUDIO_FORMATS, key=f"{key_prefix}audio_format")
     
-    def format_video_info(self, info, url):
-        """Format video information for display"""
-        # Get thumbnail
-        thumbnail = info.get('thumbnail', '')
-        if not thumbnail and info.get('thumbnails'):
-            thumbnails = info.get('thumbnails', [])
-            if thumbnails:
-                thumbnail = thumbnails[-1].get('url', '')
-        
-        # Handle view count for different platforms
-        view_count = info.get('view_count') or info.get('like_count') or info.get('repost_count') or 0
-        
-        return {
-            'title': info.get('title', 'Unknown Title'),
-            'duration': info.get('duration', 0),
-            'uploader': info.get('uploader', 'Unknown'),
-            'view_count': view_count,
-            'upload_date': info.get('upload_date', ''),
-            'thumbnail': thumbnail,
-            'formats': info.get('formats', []),
-            'platform': 'YouTube' if self.is_youtube_url(url) else info.get('extractor_key', 'Unknown')
-        }
+    return format_type, quality, output_format
+
+def select_clip_range(duration):
+    """Render start/end inputs for a partial download; return a ClipRange or None
     
-    def download_media(self, url, format_type, quality, output_format):
-        """Download media with specified parameters"""
-        try:
-            if 'working_opts' not in st.session_state:
-                st.error("Please analyze the video first")
-                return None
-                
-            opts = st.session_state.working_opts.copy()
-            opts['outtmpl'] = f"{self.download_dir}/%(title)s.%(ext)s"
-            
-            if format_type == "Audio":
-                opts.update({
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': output_format.lower(),
-                        'preferredquality': quality,
-                    }],
-                })
-            else:  # Video
-                if quality == "Best":
-                    opts['format'] = 'best'
-                elif quality == "Worst":
-                    opts['format'] = 'worst'
-                else:
-                    opts['format'] = f'best[height<={quality[:-1]}]'
-                
-                if output_format.lower() != 'original':
-                    opts['postprocessors'] = [{
-                        'key': 'FFmpegVideoConvertor',
-                        'preferedformat': output_format.lower(),
-                    }]
-            
-            # Add delay for YouTube
-            if self.is_youtube_url(url):
-                time.sleep(1)
-            
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                ydl.download([url])
-            
-            # Find downloaded file
-            files = list(Path(self.download_dir).glob('*'))
-            return str(files[0]) if files else None
-            
-        except Exception as e:
-            st.error(f"Download failed: {str(e)}")
-            return None
+    Raises ValueError when the entered range is invalid.
+    """
+    with st.expander("✂️ Clip a time range"):
+        start_col, end_col = st.columns(2)
+        with start_col:
+            start = st.text_input("Start", placeholder="0:00", key="clip_start",
+                                  help="Seconds, MM:SS or HH:MM:SS")
+        with end_col:
+            end = st.text_input("End", placeholder=ClipRange.timestamp(duration),
+                                key="clip_end", help="Leave empty to download until the end")
+        precise = st.checkbox(
+            "Keyframe-accurate cuts", key="clip_precise",
+            help="Re-encode the clip so it starts and ends exactly at the given times"
+        )
+    return parse_clip_range(start, end, duration, precise)
+
+def show_downloaded_file(downloaded_file):
+    """Offer a finished file to the browser without loading large files into memory"""
+    file_name = os.path.basename(downloaded_file)
+    file_size = os.path.getsize(downloaded_file)
     
-    def format_duration(self, seconds):
-        """Format duration in readable format"""
-        if not seconds:
-            return "Unknown"
-        
+    if file_size <= INLINE_DOWNLOAD_LIMIT_MB * 1024 * 1024:
+        # Small files can be handed to the browser in memory
+        with open(downloaded_file, 'rb') as f:
+            st.download_button(
+                label=f"📥 Download {file_name}",
+                data=f.read(),
+                file_name=file_name,
+                mime="application/octet-stream"
+            )
+    else:
+        # Large files are streamed from disk by the file server
         try:
-            seconds = int(seconds)
-            hours = seconds // 3600
-            minutes = (seconds % 3600) // 60
-            secs = seconds % 60
-            
-            if hours > 0:
-                return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-            else:
-                return f"{minutes:02d}:{secs:02d}"
-        except:
-            return "Unknown"
+            link = get_file_server().register(downloaded_file)
+            st.link_button(f"📥 Download {file_name}", link)
+        except OSError as e:
+            st.error(f"❌ File server unavailable: {str(e)}")
     
-    def format_filesize(self, size):
-        """Format file size in readable format"""
-        if not size:
-            return "Unknown"
-        
-        try:
-            size = float(size)
-            for unit in ['B', 'KB', 'MB', 'GB']:
-                if size < 1024.0:
-                    return f"{size:.1f} {unit}"
-                size /= 1024.0
-            return f"{size:.1f} TB"
-        except:
-            return "Unknown"
+    # File info
+    st.info(f"📁 File size: {st.session_state.downloader.format_filesize(file_size)}")
+    
+    # The artifact store owns the file and evicts it when over budget
 
-def main():
-    # Initialize downloader
-    if 'downloader' not in st.session_state:
-        st.session_state.downloader = MediaDownloader()
+def show_download_job(job):
+    """Render a background download job; return True while it is still running"""
+    if job is None:
+        st.warning("⚠️ Download job expired, please start it again")
+        return False
     
-    # Header (updated from youtube.py)
-    st.markdown("""
-    <div class="main-header">
-        <h1>📺 Universal Media Downloader</h1>
-        <p>Download videos and audio from YouTube, TikTok, Instagram, Vimeo, and 1000+ other platforms</p>
-    </div>
-    """, unsafe_allow_html=True)
+    downloader = st.session_state.downloader
+    progress = job.progress
+    st.caption(f"Job {job.id}: {job.description}")
+    if job.state == JOB_QUEUED:
+        st.info("⏳ Waiting for a free download slot...")
+    elif job.state == JOB_RUNNING and progress['status_text']:
+        st.progress(progress['fraction'], text=f"⬇️ {progress['status_text']}")
+    elif job.state == JOB_RUNNING:
+        details = [f"{downloader.format_filesize(progress['downloaded_bytes'])}"]
+        if progress['total_bytes']:
+            details[0] += f" / {downloader.format_filesize(progress['total_bytes'])}"
+        if progress['speed']:
+            details.append(f"{downloader.format_filesize(progress['speed'])}/s")
+        if progress['eta'] is not None:
+            details.append(f"ETA {downloader.format_duration(progress['eta']) if progress['eta'] else '00:00'}")
+        if progress['fragment_index'] and progress['fragment_count']:
+            details.append(f"fragment {progress['fragment_index']}/{progress['fragment_count']}")
+        st.progress(progress['fraction'], text="⬇️ " + " · ".join(details))
+    elif job.state == JOB_POSTPROCESSING:
+        st.progress(1.0, text=f"⚙️ Running {progress['postprocessor']}...")
+    elif job.state == JOB_DONE:
+        st.success("Download completed!")
+        if job.conversion:
+            st.caption(f"🎛️ {job.conversion['description']}")
+        if job.phases:
+            timings = " · ".join(f"{phase} {seconds:.1f}s" for phase, seconds in job.phases.items())
+            average = progress['average_speed']
+            if average:
+                timings += f" · avg {downloader.format_filesize(average)}/s"
+            st.caption(f"⏱️ {timings}")
+        if os.path.exists(job.result):
+            show_downloaded_file(job.result)
+        else:
+            st.warning("⚠️ File was evicted from the cache, please download again")
+    else:
+        st.error(f"❌ Download failed: {job.error}")
     
-    # Sidebar (copied from youtube.py)
-    with st.sidebar:
-        st.header("🎛️ Settings")
-        
-        # YouTube specific info
-        st.subheader("🎯 YouTube Support")
-        st.info("✅ Advanced bypass methods")
-        st.warning("⚠️ Success rate may vary due to bot protection")
-        
-        # Supported platforms
-        st.subheader("Supported Platforms")
-        platforms = st.session_state.downloader.supported_sites
-        for i in range(0, len(platforms), 2):
-            col1, col2 = st.columns(2)
-            with col1:
-                if i < len(platforms):
-                    st.write(f"• {platforms[i]}")
-            with col2:
-                if i + 1 < len(platforms):
-                    st.write(f"• {platforms[i + 1]}")
-        
-        st.markdown("---")
-        
-        # Quick tips
-        st.subheader("💡 Quick Tips")
-        st.write("• Paste any video URL in the input field")
-        st.write("• YouTube: Advanced bypass methods included")
-        st.write("• Choose between video or audio download")
-        st.write("• Select your preferred quality and format")
-        st.write("• Click analyze to preview before downloading")
+    return job.active
+
+def show_single_mode():
+    """Render the single-URL analyze and download flow; return True while a job is running"""
+    job_active = False
     
     # Main content (updated layout from youtube.py)
     col1, col2 = st.columns([2, 1])
@@ -379,7 +287,7 @@ def main():
         if url:
             if st.button("🔍 Analyze Video", key="analyze", type="primary"):
                 with st.spinner("Analyzing video... Please wait."):
-                    video_info = st.session_state.downloader.get_video_info(url)
+                    video_info = analyze_video(url)
                     
                     if video_info:
                         st.session_state.video_info = video_info
@@ -394,10 +302,10 @@ def main():
         st.subheader("📊 Quick Stats")
         if 'video_info' in st.session_state:
             info = st.session_state.video_info
-            duration = info.get('duration', 0)
-            view_count = info.get('view_count', 0)
-            uploader = info.get('uploader', 'Unknown')
-            platform = info.get('platform', 'Unknown')
+            duration = info.duration
+            view_count = info.view_count
+            uploader = info.uploader
+            platform = info.platform
             
             st.metric("Duration", st.session_state.downloader.format_duration(duration))
             st.metric("Views", f"{view_count:,}" if view_count and view_count > 0 else "Not available")
@@ -416,105 +324,240 @@ def main():
         
         with col1:
             # Use download-card styling
-            view_value = f"{info.get('view_count', 0):,}" if info.get('view_count', 0) > 0 else "Not available"
+            view_value = f"{info.view_count:,}" if info.view_count > 0 else "Not available"
             st.markdown(f"""
             <div class="download-card">
-                <h3>📹 {info['title']}</h3>
-                <p><strong>Platform:</strong> {info.get('platform', 'Unknown')}</p>
-                <p><strong>Uploader:</strong> {info['uploader']}</p>
-                <p><strong>Duration:</strong> {st.session_state.downloader.format_duration(info['duration'])}</p>
+                <h3>📹 {info.title}</h3>
+                <p><strong>Platform:</strong> {info.platform}</p>
+                <p><strong>Uploader:</strong> {info.uploader}</p>
+                <p><strong>Duration:</strong> {st.session_state.downloader.format_duration(info.duration)}</p>
                 <p><strong>Views:</strong> {view_value}</p>
-                <p><strong>Upload Date:</strong> {info['upload_date']}</p>
+                <p><strong>Upload Date:</strong> {info.upload_date}</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
-            if info.get('thumbnail'):
-                try:
-                    st.image(info['thumbnail'], caption="Thumbnail", use_container_width=True)
-                except Exception as e:
-                    st.warning("⚠️ Thumbnail not available")
-            else:
-                st.info("📷 No thumbnail available")
+            # Filled at the end so waiting for the thumbnail never holds up the rest of the page
+            thumbnail_slot = st.empty()
         
         # Download options
         st.subheader("⚙️ Download Options")
         
         col1, col2, col3 = st.columns(3)
         
+        format_type, quality, output_format = select_download_options(col1, col2)
+        
         with col1:
-            format_type = st.selectbox(
-                "Format Type",
-                ["Video", "Audio"],
-                help="Choose whether to download video or audio only"
-            )
+            try:
+                clip = select_clip_range(info.duration)
+                clip_error = None
+            except ValueError as e:
+                clip, clip_error = None, str(e)
+                st.error(f"❌ {clip_error}")
         
+        # Exact formats and size estimate for the current choice
+        plan = plan_conversion(info.format_index, format_type, quality, output_format, clip)
         with col2:
-            if format_type == "Video":
-                quality_options = ["Best", "1080p", "720p", "480p", "360p", "Worst"]
-                quality = st.selectbox("Quality", quality_options)
-                
-                format_options = ["Original", "MP4", "WEBM"]
-                output_format = st.selectbox("Output Format", format_options)
-            else:
-                quality_options = ["320", "256", "192", "128", "96"]
-                quality = st.selectbox("Quality (kbps)", quality_options)
-                
-                format_options = ["MP3", "AAC", "OGG"]
-                output_format = st.selectbox("Output Format", format_options)
+            estimate = plan['estimated_size']
+            st.caption(
+                f"📦 Format {plan['format']} · "
+                f"{'~' + st.session_state.downloader.format_filesize(estimate) if estimate else 'size unknown'}"
+            )
+            st.caption(f"🎛️ {plan['description']}")
         
         with col3:
             st.write("")  # Spacer
             st.write("")  # Spacer
             
-            if st.button("🚀 Download", key="download", type="primary"):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                try:
-                    status_text.text("Initializing download...")
-                    progress_bar.progress(20)
-                    
-                    downloaded_file = st.session_state.downloader.download_media(
-                        url, format_type, quality, output_format
+            if st.button("🚀 Download", key="download", type="primary", disabled=clip_error is not None):
+                if 'working_opts' not in st.session_state:
+                    st.error("Please analyze the video first")
+                else:
+                    st.session_state.download_job = st.session_state.downloader.start_download(
+                        url, format_type, quality, output_format, st.session_state.working_opts, clip
                     )
-                    
-                    progress_bar.progress(90)
-                    
-                    if downloaded_file:
-                        progress_bar.progress(100)
-                        status_text.text("Download completed!")
-                        
-                        # Read file for download
-                        with open(downloaded_file, 'rb') as f:
-                            file_data = f.read()
-                            file_name = os.path.basename(downloaded_file)
-                            
-                            st.download_button(
-                                label=f"📥 Download {file_name}",
-                                data=file_data,
-                                file_name=file_name,
-                                mime="application/octet-stream"
-                            )
-                            
-                            # File info
-                            file_size = os.path.getsize(downloaded_file)
-                            st.info(f"📁 File size: {st.session_state.downloader.format_filesize(file_size)}")
-                            
-                            # Cleanup
-                            try:
-                                os.remove(downloaded_file)
-                            except:
-                                pass
-                    else:
-                        progress_bar.progress(0)
-                        status_text.text("Download failed!")
-                        st.error("❌ Download failed")
-                        
-                except Exception as e:
-                    progress_bar.progress(0)
-                    status_text.text("")
-                    st.error(f"❌ Error: {str(e)}")
+            
+            if 'download_job' in st.session_state:
+                job = st.session_state.downloader.job_manager.get(st.session_state.download_job)
+                job_active = show_download_job(job)
+        
+        show_thumbnail(thumbnail_slot, info)
+    
+    return job_active
+
+def show_batch_mode():
+    """Render the batch/playlist flow; return True while a batch job is running"""
+    job_active = False
+    
+    st.subheader("📚 Batch Download")
+    urls_text = st.text_area(
+        "URLs",
+        height=200,
+        placeholder="One URL per line: videos, playlists or channels",
+        help="Playlists and channels are expanded automatically"
+    )
+    urls = [line.strip() for line in urls_text.splitlines() if line.strip()]
+    
+    col1, col2, col3 = st.columns(3)
+    format_type, quality, output_format = select_download_options(col1, col2, key_prefix="batch_")
+    
+    with col3:
+        st.write("")  # Spacer
+        st.write("")  # Spacer
+        
+        if st.button("🚀 Start Batch", key="start_batch", type="primary", disabled=not urls):
+            st.session_state.batch_job = st.session_state.downloader.start_batch(
+                urls, format_type, quality, output_format
+            )
+    
+    if 'batch_job' in st.session_state:
+        job = st.session_state.downloader.job_manager.get(st.session_state.batch_job)
+        job_active = show_download_job(job)
+        if job and job.details:
+            st.dataframe(
+                [
+                    {
+                        'Title': result['title'] or result['url'],
+                        'Status': result['status'],
+                        'Attempts': result['attempts'],
+                        'Error': result['error'] or '',
+                    }
+                    for result in list(job.details)
+                ],
+                use_container_width=True
+            )
+    
+    return job_active
+
+def main():
+    # Initialize downloader
+    if 'downloader' not in st.session_state:
+        st.session_state.downloader = MediaDownloader()
+    resumed_job_ids = resume_interrupted_jobs(st.session_state.downloader)
+    
+    # Header (updated from youtube.py)
+    st.markdown("""
+    <div class="main-header">
+        <h1>📺 Universal Media Downloader</h1>
+        <p>Download videos and audio from YouTube, TikTok, Instagram, Vimeo, and 1000+ other platforms</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Sidebar (copied from youtube.py)
+    with st.sidebar:
+        st.header("🎛️ Settings")
+        
+        # YouTube specific info
+        st.subheader("🎯 YouTube Support")
+        st.info("✅ Advanced bypass methods")
+        st.warning("⚠️ Success rate may vary due to bot protection")
+        
+        # Supported platforms
+        st.subheader("Supported Platforms")
+        platforms = st.session_state.downloader.supported_sites
+        for i in range(0, len(platforms), 2):
+            col1, col2 = st.columns(2)
+            with col1:
+                if i < len(platforms):
+                    st.write(f"• {platforms[i]}")
+            with col2:
+                if i + 1 < len(platforms):
+                    st.write(f"• {platforms[i + 1]}")
+        
+        st.markdown("---")
+        
+        # Metadata cache statistics
+        st.subheader("🗄️ Analysis Cache")
+        cache_stats = st.session_state.downloader.metadata_cache.stats()
+        st.write(f"• Memory hits: {cache_stats['memory_hits']}")
+        st.write(f"• Disk hits: {cache_stats['disk_hits']}")
+        st.write(f"• Misses: {cache_stats['misses']}")
+        st.write(f"• Cached videos: {cache_stats['disk_entries']}")
+        downloader_stats = st.session_state.downloader.stats
+        st.write(f"• Extractions: {downloader_stats['extractions']}")
+        st.write(f"• Downloads reusing analysis: {downloader_stats['info_reuses']}")
+        conversions = downloader_stats['conversions']
+        st.write(
+            f"• Conversions: {conversions['copy']} copied, "
+            f"{conversions['remux']} remuxed, {conversions['transcode']} re-encoded"
+        )
+        artifact_stats = st.session_state.downloader.artifact_store.stats()
+        st.write(f"• Files served from store: {artifact_stats['hits'] + artifact_stats['shared']}")
+        thumbnail_stats = st.session_state.downloader.thumbnail_cache.stats()
+        st.write(f"• Thumbnails: {thumbnail_stats['hits']} served from cache, {thumbnail_stats['fetches']} fetched")
+        
+        # Time spent waiting for the per-host rate limiter
+        limiter_stats = st.session_state.downloader.rate_limiter.stats()
+        if limiter_stats:
+            st.subheader("🚦 Rate Limiter")
+            for host, metrics in limiter_stats.items():
+                average_wait = metrics['total_wait'] / metrics['requests'] if metrics['requests'] else 0
+                st.write(
+                    f"• {host}: {metrics['requests']} requests, "
+                    f"{average_wait:.2f}s avg wait, {metrics['throttled']} throttled"
+                )
+        
+        # Which extraction strategy works (and how fast) on each platform
+        strategy_rows = st.session_state.downloader.strategy_registry.export()
+        if strategy_rows:
+            st.subheader("🧭 Extraction Strategies")
+            for row in strategy_rows:
+                latency = f"{row['latency']:.1f}s" if row['latency'] is not None else "n/a"
+                st.write(
+                    f"• {row['platform']} / {row['strategy']}: {row['success_rate']:.0%} success, "
+                    f"{latency}{' (dropped)' if row['dropped'] else ''}"
+                )
+            st.download_button(
+                "📤 Export strategy stats",
+                data=json.dumps(strategy_rows, indent=2),
+                file_name="strategy_stats.json",
+                mime="application/json",
+            )
+        
+        # Connections chosen by the download accelerator
+        tuner_stats = st.session_state.downloader.connection_tuner.stats()
+        if tuner_stats:
+            st.subheader("⚡ Acceleration")
+            for host, tuning in tuner_stats.items():
+                best = max(tuning['throughput'].values(), default=0)
+                st.write(
+                    f"• {host}: {tuning['connections']} connections"
+                    f"{' (settled)' if tuning['settled'] else ''}, "
+                    f"best {st.session_state.downloader.format_filesize(best)}/s"
+                )
+        
+        # Where download wall-clock time goes
+        phase_summary = st.session_state.downloader.job_manager.phase_summary()
+        if phase_summary:
+            st.subheader("⏱️ Download Timings")
+            for phase, summary in phase_summary.items():
+                st.write(f"• {phase.capitalize()}: {summary['mean']:.1f}s avg over {summary['count']} jobs")
+        
+        # Downloads interrupted by a restart and picked up from their partial files
+        resumed_jobs = [job for job in map(st.session_state.downloader.job_manager.get, resumed_job_ids) if job]
+        if resumed_jobs:
+            st.subheader("🔁 Resumed Downloads")
+            for job in resumed_jobs:
+                st.write(f"• {job.description}: {job.state}")
+            # Status only: the jobs belong to whoever started them, and a session
+            # gets the finished file by requesting it again (an artifact store hit)
+            st.caption("Request the same download again to get a finished file.")
+        
+        st.markdown("---")
+        
+        # Quick tips
+        st.subheader("💡 Quick Tips")
+        st.write("• Paste any video URL in the input field")
+        st.write("• YouTube: Advanced bypass methods included")
+        st.write("• Choose between video or audio download")
+        st.write("• Select your preferred quality and format")
+        st.write("• Click analyze to preview before downloading")
+    
+    mode = st.radio("Mode", ["Single URL", "Batch"], horizontal=True, label_visibility="collapsed")
+    if mode == "Batch":
+        job_active = show_batch_mode()
+    else:
+        job_active = show_single_mode()
     
     # Footer (updated from youtube.py)
     st.markdown("---")
@@ -525,6 +568,11 @@ def main():
         <p><small>⚠️ Please respect copyright laws and platform terms of service.</small></p>
     </div>
     """, unsafe_allow_html=True)
+    
+    # Poll the background job so its progress keeps updating
+    if job_active:
+        time.sleep(1)
+        st.rerun()
 
 if __name__ == "__main__":
     main()